@@ -1,7 +1,38 @@
 from enum import Enum
-from typing import NamedTuple, List, Tuple, Dict, Any
+from typing import NamedTuple, List, Tuple, Dict, Any, Iterable, Iterator, Callable
+from collections import Counter, OrderedDict, deque
+from collections.abc import Mapping, Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from array import array
+from contextvars import ContextVar
+import argparse
+import asyncio
+import bisect
+import csv
+import hashlib
+import heapq
+import itertools
 import math
+import mmap
 import json
+import logging
+import os
+import pickle
+import random
+import string
+import struct
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+try:
+    import numpy as np
+except ImportError:  # columnar scoring is optional
+    np = None
+
+logger = logging.getLogger(__name__)
 
 # --- 1. Core Logic Types (from previous implementation) ---
 class Belnap(Enum):
@@ -10,6 +41,9 @@ class Belnap(Enum):
     B = "Both"    # Contradiction
     N = "Neither" # Unknown
 
+BELIEF_CODES = {Belnap.T: 0, Belnap.F: 1, Belnap.B: 2, Belnap.N: 3}
+BELIEFS_BY_CODE = tuple(BELIEF_CODES)
+
 class Evidence(NamedTuple):
     source: str
     belief: Belnap
@@ -28,7 +62,146 @@ class ToneStyle(Enum):
     NEUTRAL = "neutral"
 
 # --- 2. Enhanced Evidence Database ---
-evidence_db = {
+_db_ids = itertools.count()
+_versions = itertools.count(1)
+
+class _VersionedList(list):
+    """Evidence list that bumps its proposition's version on every mutation."""
+    __slots__ = ("_owner", "_prop")
+
+    def __init__(self, owner: "VersionedEvidenceDB", prop: str, items: Iterable[Evidence] = ()):
+        super().__init__(items)
+        self._owner = owner
+        self._prop = prop
+
+    def _mutator(name: str):
+        method = getattr(list, name)
+
+        def mutate(self, *args, **kwargs):
+            result = method(self, *args, **kwargs)
+            self._owner._touch(self._prop)
+            return result
+        mutate.__name__ = name
+        return mutate
+
+    append = _mutator("append")
+    extend = _mutator("extend")
+    insert = _mutator("insert")
+    remove = _mutator("remove")
+    pop = _mutator("pop")
+    clear = _mutator("clear")
+    sort = _mutator("sort")
+    reverse = _mutator("reverse")
+    __setitem__ = _mutator("__setitem__")
+    __delitem__ = _mutator("__delitem__")
+    __iadd__ = _mutator("__iadd__")
+    __imul__ = _mutator("__imul__")
+    del _mutator
+
+    def __reduce__(self):
+        # Unpickling appends before the owner is restored; a detached copy is a plain list
+        return list, (list(self),)
+
+class VersionedEvidenceDB(dict):
+    """``evidence_db`` dict that tracks a version per proposition.
+
+    Any change (assigning, deleting or mutating a proposition's evidence
+    list, including through ``update`` and ``|=``) gives that proposition a
+    fresh, never-reused version, which lets ``decide`` memoize results
+    safely. Assigned lists are copied into tracked lists, so keep mutating
+    ``db[prop]`` rather than the original; ``copy()`` and ``|`` return new
+    ``VersionedEvidenceDB``s.
+    """
+
+    def __init__(self, evidence: Dict[str, List[Evidence]] = None):
+        super().__init__()
+        self.uid = next(_db_ids)
+        self._prop_versions: Dict[str, int] = {}
+        self.update(evidence or {})
+
+    def _touch(self, prop: str) -> None:
+        self._prop_versions[prop] = next(_versions)
+
+    def version(self, prop: str) -> int:
+        return self._prop_versions.get(prop, 0)
+
+    def __setitem__(self, prop: str, evs: List[Evidence]) -> None:
+        super().__setitem__(prop, _VersionedList(self, prop, evs))
+        self._touch(prop)
+
+    def __delitem__(self, prop: str) -> None:
+        super().__delitem__(prop)
+        self._touch(prop)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for prop, evs in dict(*args, **kwargs).items():
+            self[prop] = evs
+
+    def setdefault(self, prop: str, default: List[Evidence] = None) -> List[Evidence]:
+        if prop not in self:
+            self[prop] = default if default is not None else []
+        return self[prop]
+
+    def pop(self, prop: str, *default: Any) -> Any:
+        if prop in self:
+            self._touch(prop)
+        return super().pop(prop, *default)
+
+    def popitem(self) -> Tuple[str, List[Evidence]]:
+        prop, evs = super().popitem()
+        self._touch(prop)
+        return prop, evs
+
+    def clear(self) -> None:
+        for prop in self:
+            self._touch(prop)
+        super().clear()
+
+    def __ior__(self, other: Dict[str, List[Evidence]]) -> "VersionedEvidenceDB":
+        self.update(other)
+        return self
+
+    def __or__(self, other: Dict[str, List[Evidence]]) -> "VersionedEvidenceDB":
+        if not isinstance(other, dict):
+            return NotImplemented
+        merged = self.copy()
+        merged.update(other)
+        return merged
+
+    def __ror__(self, other: Dict[str, List[Evidence]]) -> "VersionedEvidenceDB":
+        if not isinstance(other, dict):
+            return NotImplemented
+        merged = VersionedEvidenceDB(other)
+        merged.update(self)
+        return merged
+
+    def copy(self) -> "VersionedEvidenceDB":
+        """An independent database (own lists and versions) with the same evidence."""
+        return VersionedEvidenceDB(self)
+
+    def __reduce__(self):
+        return VersionedEvidenceDB, ({prop: list(evs) for prop, evs in self.items()},)
+
+def verify_versioned_pickling() -> bool:
+    """Check that a ``VersionedEvidenceDB`` and its lists survive a pickle round trip.
+
+    Process pools (``run_sharded_recommendations``) pickle every user's
+    evidence; the restored database must still version its mutations.
+    """
+    db = VersionedEvidenceDB(evidence_db)
+    restored = pickle.loads(pickle.dumps(db))
+    evs = pickle.loads(pickle.dumps(db["Likes(Hiking)"]))
+    version = restored.version("Likes(Hiking)")
+    restored["Likes(Hiking)"].append(Evidence("UserSurvey", Belnap.F, 0.2))
+    return (
+        type(restored) is VersionedEvidenceDB
+        and type(evs) is list
+        and evs == db["Likes(Hiking)"]
+        and restored.version("Likes(Hiking)") > version
+        and restored["Likes(Hiking)"][:-1] == db["Likes(Hiking)"]
+    )
+
+evidence_db = VersionedEvidenceDB({
     "Stressed(User)": [
         Evidence("HeartRateMonitor", Belnap.T, 0.85),
         Evidence("JournalEntry", Belnap.T, 0.75),
@@ -51,7 +224,7 @@ evidence_db = {
         Evidence("PhotoAnalysis", Belnap.T, 0.70),
         Evidence("WeatherCorrelation", Belnap.T, 0.60)
     ]
-}
+})
 
 activities_db = {
     "MeditationRetreat": {
@@ -92,15 +265,332 @@ activities_db = {
     }
 }
 
-# --- 3. Core Reasoning Functions ---
-def decide(prop: str, verbose: bool = False) -> Decision:
-    """Enhanced decide with detailed reasoning trace."""
-    evs = evidence_db.get(prop, [])
+# --- 3. Instrumentation ---
+_current_span: ContextVar = ContextVar("vance_current_span", default=None)
+
+class _NullSpan:
+    """Shared no-op span handed out while instrumentation is disabled."""
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class Span:
+    """A timed pipeline stage; nests through a context variable, so asyncio tasks inherit it.
+
+    An explicit ``parent`` overrides the context, for work that runs after
+    the span that caused it has ended (lazy explanation rendering).
+    """
+    __slots__ = ("_owner", "_token", "_parent", "name", "trace_id", "span_id", "parent_id",
+                 "start_ns", "end_ns", "attributes")
+
+    def __init__(self, owner: "Instrumentation", name: str, attributes: Dict[str, Any], parent: "Span" = None):
+        self._owner = owner
+        self._token = None
+        self._parent = parent
+        self.name = name
+        self.attributes = attributes
+        self.span_id = os.urandom(8).hex()
+        self.trace_id = self.parent_id = None
+        self.start_ns = self.end_ns = 0
+
+    def _attach(self, parent: "Span") -> None:
+        if parent is None:
+            self.trace_id = os.urandom(16).hex()
+        else:
+            self.trace_id, self.parent_id = parent.trace_id, parent.span_id
+
+    def __enter__(self) -> "Span":
+        self._attach(self._parent or _current_span.get())
+        self._token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        self._owner.spans.append(self)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+class StdoutSubscriber:
+    """Renders pipeline events as the human-readable ``verbose`` trace."""
+
+    def __call__(self, event: str, fields: Dict[str, Any]) -> None:
+        if event == "pipeline_start":
+            print("=" * 60)
+            print("🧠 EXPLAINABLE AI REASONING SYSTEM")
+            print("=" * 60)
+        elif event == "no_evidence":
+            print(f"  🔍 {fields['reasoning']}")
+        elif event == "evidence":
+            print(f"  🔍 Evidence for {fields['prop']}:")
+            for e in fields["evidence"]:
+                print(f"    - {e.source}: {e.belief.value} (weight={e.weight})")
+            print(f"    Totals: T={fields['t_weight']:.2f}, F={fields['f_weight']:.2f}, B={fields['b_weight']:.2f}")
+        elif event == "decision":
+            decision = fields["decision"]
+            print(f"    ⚖️  Result: {decision.truth.value} (confidence={decision.confidence:.2f}) - {decision.reasoning}")
+        elif event == "decisions":
+            print(f"\n📊 DECISIONS SUMMARY:")
+            for key, dec in fields["decisions"].items():
+                print(f"  {key}: {dec.truth.value} (conf={dec.confidence:.2f})")
+        elif event == "filtered":
+            print(f"  ❌ {fields['activity']} filtered: {fields['reason']}")
+        elif event == "passed":
+            print(f"  ✅ {fields['activity']} passed crowd filter")
+        elif event == "recommendation":
+            rec = fields["recommendation"]
+            print(f"\n🏆 #{rec.rank}: {rec.activity} (score={rec.score:.2f})")
+            print(f"   📝 {rec.summary}")
+            print(f"   💬 {rec.explanation}")
+        elif event == "pipeline_end":
+            print("=" * 60)
+
+_STDOUT = StdoutSubscriber()
+
+class Instrumentation:
+    """Opt-in spans, counters and events for the reasoning pipeline.
+
+    Spans and counters are recorded only while ``enabled`` is set, and
+    events only reach subscribers that were attached (or stdout for a
+    ``verbose`` call). Call sites test one attribute first, so when nothing
+    is listening the cost is a single branch per stage. Recorded spans and
+    counters can be exported as OpenTelemetry (OTLP/JSON) documents.
+    """
+
+    def __init__(self, max_spans: int = 10000, service_name: str = "vance-recommender"):
+        self.enabled = False
+        self.service_name = service_name
+        self.subscribers: List[Callable[[str, Dict[str, Any]], None]] = []
+        self.spans = deque(maxlen=max_spans)
+        self.counters: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscriber: Callable[[str, Dict[str, Any]], None]) -> None:
+        self.subscribers = self.subscribers + [subscriber]
+
+    def unsubscribe(self, subscriber: Callable[[str, Dict[str, Any]], None]) -> None:
+        self.subscribers = [s for s in self.subscribers if s is not subscriber]
+
+    def emitter(self, verbose: bool = False) -> Callable[..., None]:
+        """Event sink for one call, or ``None`` when nobody is listening."""
+        sinks = ([_STDOUT] if verbose else []) + self.subscribers
+        if not sinks:
+            return None
+        
+        def emit(event: str, **fields: Any) -> None:
+            for sink in sinks:
+                sink(event, fields)
+        return emit
+
+    def span(self, name: str, parent: Span = None, **attributes: Any):
+        if not self.enabled:
+            return _NULL_SPAN
+        return Span(self, name, attributes, parent)
+
+    def record_span(self, name: str, start_ns: int, duration_ns: int, **attributes: Any) -> None:
+        """Record an already-measured stage as a child of the current span."""
+        if not self.enabled:
+            return
+        span = Span(self, name, attributes)
+        span._attach(_current_span.get())
+        span.start_ns, span.end_ns = start_ns, start_ns + duration_ns
+        self.spans.append(span)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def reset(self) -> None:
+        with self._lock:
+            self.spans.clear()
+            self.counters.clear()
+
+    def export_otel_json(self, path: str = None) -> Dict[str, Any]:
+        """Spans and counters as an OTLP/JSON document, optionally written to ``path``."""
+        def attributes(values: Dict[str, Any]) -> List[Dict[str, Any]]:
+            out = []
+            for key, value in values.items():
+                if isinstance(value, bool):
+                    out.append({"key": key, "value": {"boolValue": value}})
+                elif isinstance(value, int):
+                    out.append({"key": key, "value": {"intValue": str(value)}})
+                elif isinstance(value, float):
+                    out.append({"key": key, "value": {"doubleValue": value}})
+                else:
+                    out.append({"key": key, "value": {"stringValue": str(value)}})
+            return out
+        
+        with self._lock:
+            spans, counters = list(self.spans), dict(self.counters)
+        resource = {"attributes": attributes({"service.name": self.service_name})}
+        scope = {"name": __name__}
+        now = str(time.time_ns())
+        document = {
+            "resourceSpans": [{
+                "resource": resource,
+                "scopeSpans": [{
+                    "scope": scope,
+                    "spans": [
+                        {
+                            "traceId": span.trace_id,
+                            "spanId": span.span_id,
+                            "parentSpanId": span.parent_id or "",
+                            "name": span.name,
+                            "kind": 1,
+                            "startTimeUnixNano": str(span.start_ns),
+                            "endTimeUnixNano": str(span.end_ns),
+                            "attributes": attributes(span.attributes)
+                        }
+                        for span in spans
+                    ]
+                }]
+            }],
+            "resourceMetrics": [{
+                "resource": resource,
+                "scopeMetrics": [{
+                    "scope": scope,
+                    "metrics": [
+                        {
+                            "name": name,
+                            "sum": {
+                                "dataPoints": [{"asInt": str(value), "timeUnixNano": now}],
+                                "aggregationTemporality": 2,
+                                "isMonotonic": True
+                            }
+                        }
+                        for name, value in sorted(counters.items())
+                    ]
+                }]
+            }]
+        }
+        if path is not None:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(document, f)
+        return document
+
+# Process-wide instrumentation; set ``instrumentation.enabled = True`` to record
+instrumentation = Instrumentation()
+
+# --- 4. Core Reasoning Functions ---
+def _verdict(t_weight: float, f_weight: float) -> Belnap:
+    """Belnap truth value for weighted supporting/opposing evidence."""
+    if t_weight > 0 and f_weight > 0:
+        return Belnap.B
+    elif t_weight > f_weight:
+        return Belnap.T
+    elif f_weight > t_weight:
+        return Belnap.F
+    return Belnap.N
+
+def _verdict_reasoning(truth: Belnap, t_weight: float, f_weight: float) -> str:
+    if truth == Belnap.B:
+        return f"Contradiction: both supporting ({t_weight:.2f}) and opposing ({f_weight:.2f}) evidence"
+    elif truth == Belnap.T:
+        return f"Supported: {t_weight:.2f} > {f_weight:.2f}"
+    elif truth == Belnap.F:
+        return f"Opposed: {f_weight:.2f} > {t_weight:.2f}"
+    return f"Balanced or unknown: T={t_weight:.2f}, F={f_weight:.2f}"
+
+def _sigmoid_confidence(t_weight: float, f_weight: float, total: float) -> float:
+    if total > 0:
+        net_evidence = abs(t_weight - f_weight)
+        return 1 / (1 + math.exp(-4 * (net_evidence / total - 0.1)))
+    return 0.0
+
+class DecisionCache:
+    """Bounded LRU (optionally TTL) cache of ``Decision``s.
+
+    Keys include the evidence version, so entries go stale automatically
+    when a ``VersionedEvidenceDB`` changes; stale entries simply age out.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple, Tuple[Decision, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key: Tuple) -> Decision:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Tuple, decision: Decision) -> None:
+        with self._lock:
+            self._entries[key] = (decision, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "size": len(self._entries),
+                "maxsize": self.maxsize
+            }
+
+# Shared by every ``decide`` call over a ``VersionedEvidenceDB``
+decision_cache = DecisionCache()
+
+def decide(prop: str, verbose: bool = False, evidence: Dict[str, List[Evidence]] = None) -> Decision:
+    """Enhanced decide with detailed reasoning trace.
+
+    ``evidence`` defaults to the module-level ``evidence_db``; pass a
+    per-user mapping to decide for someone else. Decisions over a
+    ``VersionedEvidenceDB`` are memoized in ``decision_cache`` unless
+    ``verbose`` asks for the full trace; with subscribers attached, a cache
+    hit emits just a ``decision`` event (with ``cached=True``).
+    """
+    source = evidence_db if evidence is None else evidence
+    emit = instrumentation.emitter(verbose)
     
+    if isinstance(source, VersionedEvidenceDB) and not verbose:
+        key = (source.uid, prop, source.version(prop))
+        decision = decision_cache.get(key)
+        if decision is None:
+            decision = _decide(prop, source.get(prop, []), emit)
+            decision_cache.put(key, decision)
+        elif emit:
+            emit("decision", decision=decision, cached=True)
+        return decision
+    
+    return _decide(prop, source.get(prop, []), emit)
+
+def _decide(prop: str, evs: List[Evidence], emit: Callable[..., None]) -> Decision:
     if not evs:
         reasoning = f"No evidence found for {prop}"
-        if verbose:
-            print(f"  🔍 {reasoning}")
+        if emit:
+            emit("no_evidence", prop=prop, reasoning=reasoning)
         return Decision(prop, Belnap.N, 0.0, reasoning)
     
     t_weight = sum(e.weight for e in evs if e.belief == Belnap.T)
@@ -108,99 +598,242 @@ def decide(prop: str, verbose: bool = False) -> Decision:
     b_weight = sum(e.weight for e in evs if e.belief == Belnap.B)
     total = t_weight + f_weight + b_weight
     
-    if verbose:
-        print(f"  🔍 Evidence for {prop}:")
-        for e in evs:
-            print(f"    - {e.source}: {e.belief.value} (weight={e.weight})")
-        print(f"    Totals: T={t_weight:.2f}, F={f_weight:.2f}, B={b_weight:.2f}")
+    if emit:
+        emit("evidence", prop=prop, evidence=evs, t_weight=t_weight, f_weight=f_weight, b_weight=b_weight)
     
+    decision = _decision_from_totals(prop, t_weight, f_weight, b_weight)
+    
+    if emit and total != 0:
+        emit("decision", decision=decision)
+    
+    return decision
+
+def _decision_from_totals(prop: str, t_weight: float, f_weight: float, b_weight: float) -> Decision:
+    """Decision for a proposition with at least one piece of evidence."""
+    total = t_weight + f_weight + b_weight
     if total == 0:
         reasoning = f"All evidence has zero weight"
         return Decision(prop, Belnap.N, 0.0, reasoning)
     
     # Determine truth value
-    if t_weight > 0 and f_weight > 0:
-        truth = Belnap.B
-        reasoning = f"Contradiction: both supporting ({t_weight:.2f}) and opposing ({f_weight:.2f}) evidence"
-    elif t_weight > f_weight:
-        truth = Belnap.T
-        reasoning = f"Supported: {t_weight:.2f} > {f_weight:.2f}"
-    elif f_weight > t_weight:
-        truth = Belnap.F
-        reasoning = f"Opposed: {f_weight:.2f} > {t_weight:.2f}"
-    else:
-        truth = Belnap.N
-        reasoning = f"Balanced or unknown: T={t_weight:.2f}, F={f_weight:.2f}"
+    truth = _verdict(t_weight, f_weight)
+    reasoning = _verdict_reasoning(truth, t_weight, f_weight)
     
     # Calculate confidence using sigmoid
-    if total > 0:
-        net_evidence = abs(t_weight - f_weight)
-        confidence = 1 / (1 + math.exp(-4 * (net_evidence / total - 0.1)))
-    else:
-        confidence = 0.0
-    
-    if verbose:
-        print(f"    ⚖️  Result: {truth.value} (confidence={confidence:.2f}) - {reasoning}")
+    confidence = _sigmoid_confidence(t_weight, f_weight, total)
     
     return Decision(prop, truth, confidence, reasoning)
 
-# --- 4. Natural Language Explanation Generator ---
+# Relative slack for float drift when checking a retraction against the totals
+RETRACT_TOLERANCE = 1e-9
+
+class DecisionStore:
+    """Incrementally maintained decisions over a stream of evidence.
+
+    Keeps running T/F/B weight totals (and per-belief counts) for each
+    proposition, so appending or retracting one ``Evidence`` is O(1) and
+    ``decision()`` only re-derives the verdict from the totals when the
+    proposition changed since it was last read.
+    """
+
+    def __init__(self, evidence: Dict[str, List[Evidence]] = None):
+        self._weights: Dict[str, List[float]] = {}
+        self._counts: Dict[str, List[int]] = {}
+        self._decisions: Dict[str, Decision] = {}
+        for prop, evs in (evidence or {}).items():
+            for e in evs:
+                self.append(prop, e)
+
+    def append(self, prop: str, evidence: Evidence) -> None:
+        code = BELIEF_CODES[evidence.belief]
+        weights = self._weights.setdefault(prop, [0.0, 0.0, 0.0, 0.0])
+        counts = self._counts.setdefault(prop, [0, 0, 0, 0])
+        weights[code] += evidence.weight
+        counts[code] += 1
+        self._decisions.pop(prop, None)
+
+    def extend(self, prop: str, evidence: Iterable[Evidence]) -> None:
+        """Bulk ``append``; the cached decision is invalidated once."""
+        weights = self._weights.setdefault(prop, [0.0, 0.0, 0.0, 0.0])
+        counts = self._counts.setdefault(prop, [0, 0, 0, 0])
+        for e in evidence:
+            code = BELIEF_CODES[e.belief]
+            weights[code] += e.weight
+            counts[code] += 1
+        if not any(counts):
+            del self._weights[prop], self._counts[prop]
+        self._decisions.pop(prop, None)
+
+    def retract(self, prop: str, evidence: Evidence) -> None:
+        """Remove a previously appended ``Evidence`` from ``prop``'s totals.
+
+        Only totals are kept, so ``evidence`` must be the record that was
+        appended. A retraction whose weight the totals cannot account for
+        (it would leave a negative total, or a non-zero one after the last
+        record of that belief) raises ``ValueError`` and changes nothing.
+        """
+        code = BELIEF_CODES[evidence.belief]
+        counts = self._counts.get(prop)
+        if counts is None or counts[code] == 0:
+            raise ValueError(f"No {evidence.belief.value} evidence to retract for {prop}")
+        weights = self._weights[prop]
+        remaining = weights[code] - evidence.weight
+        tolerance = RETRACT_TOLERANCE * max(1.0, abs(weights[code]))
+        if remaining < -tolerance or (counts[code] == 1 and remaining > tolerance):
+            raise ValueError(
+                f"Cannot retract {evidence.belief.value} evidence of weight {evidence.weight} for {prop}: "
+                f"only {weights[code]:.6g} recorded across {counts[code]} item(s)"
+            )
+        counts[code] -= 1
+        # Reset exactly once a belief has no evidence left, so rounding drift
+        # from repeated subtraction can never fake a contradiction.
+        weights[code] = weights[code] - evidence.weight if counts[code] else 0.0
+        if not any(counts):
+            del self._weights[prop], self._counts[prop]
+        self._decisions.pop(prop, None)
+
+    def decision(self, prop: str) -> Decision:
+        cached = self._decisions.get(prop)
+        if cached is not None:
+            return cached
+        weights = self._weights.get(prop)
+        if weights is None:
+            decision = Decision(prop, Belnap.N, 0.0, f"No evidence found for {prop}")
+        else:
+            decision = _decision_from_totals(prop, weights[0], weights[1], weights[2])
+        self._decisions[prop] = decision
+        return decision
+
+# --- 5. Natural Language Explanation Generator ---
+EXPLANATION_TEMPLATES = {
+    ToneStyle.CASUAL: {
+        "context_stress_high": "You seem pretty stressed right now (I'm {confidence}% confident based on {sources}).",
+        "context_stress_medium": "You're showing some signs of stress (confidence: {confidence}%).",
+        "context_stress_low": "You appear relatively calm right now.",
+        "recommendation": "I picked **{option}** because it's great for {primary_reason}. {secondary_reasons}",
+        "confidence_high": "I'm quite confident about this choice.",
+        "confidence_medium": "I'm moderately confident in this recommendation.",
+        "confidence_low": "I'm somewhat uncertain, but this seems like the best option.",
+        "contradiction": "I know you have {factor}, but {resolution}.",
+        "filtered": "I ruled out **{option}** since {reason}.",
+        "summary": "Perfect for {key_benefit}!"
+    },
+    ToneStyle.EXPERT: {
+        "context_stress_high": "Elevated stress indicators detected (confidence: {confidence}%, sources: {sources}).",
+        "context_stress_medium": "Moderate stress signals observed (confidence: {confidence}%).",
+        "context_stress_low": "Baseline stress levels detected.",
+        "recommendation": "**{option}** selected for optimal {primary_reason}. {secondary_reasons}",
+        "confidence_high": "High confidence recommendation.",
+        "confidence_medium": "Moderate confidence level.",
+        "confidence_low": "Lower confidence due to limited data.",
+        "contradiction": "Conflicting evidence for {factor} resolved via {resolution}.",
+        "filtered": "**{option}** eliminated: {reason}.",
+        "summary": "Optimized for {key_benefit}."
+    },
+    ToneStyle.EMPATHETIC: {
+        "context_stress_high": "I can see you're going through a stressful time right now (I'm {confidence}% confident based on {sources}).",
+        "context_stress_medium": "You might be feeling a bit overwhelmed lately (confidence: {confidence}%).",
+        "context_stress_low": "You seem to be in a good headspace right now.",
+        "recommendation": "I think **{option}** would be really good for you because it excels at {primary_reason}. {secondary_reasons}",
+        "confidence_high": "I feel quite sure this is a great choice for you.",
+        "confidence_medium": "This seems like a solid option for your situation.",
+        "confidence_low": "I'm not entirely sure, but I think this might help you.",
+        "contradiction": "I understand you have {factor}, but I believe {resolution}.",
+        "filtered": "I didn't suggest **{option}** because {reason}, and I want to respect your preferences.",
+        "summary": "Thoughtfully chosen for {key_benefit}."
+    },
+    ToneStyle.NEUTRAL: {
+        "context_stress_high": "Current stress level: high (confidence: {confidence}%, sources: {sources}).",
+        "context_stress_medium": "Current stress level: moderate (confidence: {confidence}%).",
+        "context_stress_low": "Current stress level: low.",
+        "recommendation": "**{option}** recommended for {primary_reason}. {secondary_reasons}",
+        "confidence_high": "High confidence.",
+        "confidence_medium": "Moderate confidence.",
+        "confidence_low": "Low confidence.",
+        "contradiction": "Contradiction in {factor} resolved: {resolution}.",
+        "filtered": "Filtered: **{option}** - {reason}.",
+        "summary": "Selected for {key_benefit}."
+    }
+}
+
+_FORMATTER = string.Formatter()
+
+class CompiledTemplate:
+    """An explanation template with its field names extracted once.
+
+    Templates without placeholders render as a constant; the rest call the
+    source string's bound ``str.format``, which is still faster than
+    re-joining pre-split pieces in Python. Instances are immutable and
+    shared across threads.
+    """
+    __slots__ = ("source", "fields", "_format")
+
+    def __init__(self, source: str):
+        self.source = source
+        self.fields = tuple(
+            field for _, field, _, _ in _FORMATTER.parse(source) if field is not None
+        )
+        self._format = source.format
+
+    def render(self, **values: Any) -> str:
+        if not self.fields:
+            return self.source
+        return self._format(**values)
+
+def _compile_templates(templates: Dict[ToneStyle, Dict[str, str]]) -> Dict[ToneStyle, Dict[str, CompiledTemplate]]:
+    return {
+        tone: {key: CompiledTemplate(source) for key, source in entries.items()}
+        for tone, entries in templates.items()
+    }
+
+# Process-wide registry, built once at import and only ever read afterwards
+COMPILED_TEMPLATES = _compile_templates(EXPLANATION_TEMPLATES)
+_COMPILED_SOURCES = {tone: dict(entries) for tone, entries in EXPLANATION_TEMPLATES.items()}
+_EMPTY_TEMPLATE = CompiledTemplate("")
+
+def _compile_tone(tone: ToneStyle, entries: Dict[str, str]) -> Dict[str, CompiledTemplate]:
+    """Compiled ``entries``, reusing the shared registry when they are the defaults."""
+    if entries == _COMPILED_SOURCES.get(tone):
+        return COMPILED_TEMPLATES[tone]
+    return {key: CompiledTemplate(source) for key, source in entries.items()}
+
 class ExplanationGenerator:
-    def __init__(self, tone: ToneStyle = ToneStyle.NEUTRAL):
+    """Renders reasoning traces in one ``ToneStyle``.
+
+    ``templates`` overrides the wording per instance: a
+    ``{ToneStyle: {key: template}}`` mapping merged over
+    ``EXPLANATION_TEMPLATES``. Subclasses may instead override
+    ``_load_templates`` to assign ``self.templates``. Either way the
+    templates are compiled when the generator is built, so later edits to
+    ``self.templates`` are not picked up.
+    """
+
+    def __init__(self, tone: ToneStyle = ToneStyle.NEUTRAL, templates: Dict[ToneStyle, Dict[str, str]] = None):
         self.tone = tone
+        self._overrides = templates
+        self._templates = None
         self._load_templates()
+        if self._templates is None and not templates:
+            entries = EXPLANATION_TEMPLATES.get(tone, {})
+        else:
+            entries = self.templates.get(tone, {})
+        self._compiled = _compile_tone(tone, entries)
     
     def _load_templates(self):
-        self.templates = {
-            ToneStyle.CASUAL: {
-                "context_stress_high": "You seem pretty stressed right now (I'm {confidence}% confident based on {sources}).",
-                "context_stress_medium": "You're showing some signs of stress (confidence: {confidence}%).",
-                "context_stress_low": "You appear relatively calm right now.",
-                "recommendation": "I picked **{option}** because it's great for {primary_reason}. {secondary_reasons}",
-                "confidence_high": "I'm quite confident about this choice.",
-                "confidence_medium": "I'm moderately confident in this recommendation.",
-                "confidence_low": "I'm somewhat uncertain, but this seems like the best option.",
-                "contradiction": "I know you have {factor}, but {resolution}.",
-                "filtered": "I ruled out **{option}** since {reason}.",
-                "summary": "Perfect for {key_benefit}!"
-            },
-            ToneStyle.EXPERT: {
-                "context_stress_high": "Elevated stress indicators detected (confidence: {confidence}%, sources: {sources}).",
-                "context_stress_medium": "Moderate stress signals observed (confidence: {confidence}%).",
-                "context_stress_low": "Baseline stress levels detected.",
-                "recommendation": "**{option}** selected for optimal {primary_reason}. {secondary_reasons}",
-                "confidence_high": "High confidence recommendation.",
-                "confidence_medium": "Moderate confidence level.",
-                "confidence_low": "Lower confidence due to limited data.",
-                "contradiction": "Conflicting evidence for {factor} resolved via {resolution}.",
-                "filtered": "**{option}** eliminated: {reason}.",
-                "summary": "Optimized for {key_benefit}."
-            },
-            ToneStyle.EMPATHETIC: {
-                "context_stress_high": "I can see you're going through a stressful time right now (I'm {confidence}% confident based on {sources}).",
-                "context_stress_medium": "You might be feeling a bit overwhelmed lately (confidence: {confidence}%).",
-                "context_stress_low": "You seem to be in a good headspace right now.",
-                "recommendation": "I think **{option}** would be really good for you because it excels at {primary_reason}. {secondary_reasons}",
-                "confidence_high": "I feel quite sure this is a great choice for you.",
-                "confidence_medium": "This seems like a solid option for your situation.",
-                "confidence_low": "I'm not entirely sure, but I think this might help you.",
-                "contradiction": "I understand you have {factor}, but I believe {resolution}.",
-                "filtered": "I didn't suggest **{option}** because {reason}, and I want to respect your preferences.",
-                "summary": "Thoughtfully chosen for {key_benefit}."
-            },
-            ToneStyle.NEUTRAL: {
-                "context_stress_high": "Current stress level: high (confidence: {confidence}%, sources: {sources}).",
-                "context_stress_medium": "Current stress level: moderate (confidence: {confidence}%).",
-                "context_stress_low": "Current stress level: low.",
-                "recommendation": "**{option}** recommended for {primary_reason}. {secondary_reasons}",
-                "confidence_high": "High confidence.",
-                "confidence_medium": "Moderate confidence.",
-                "confidence_low": "Low confidence.",
-                "contradiction": "Contradiction in {factor} resolved: {resolution}.",
-                "filtered": "Filtered: **{option}** - {reason}.",
-                "summary": "Selected for {key_benefit}."
-            }
-        }
+        """Hook for subclasses: assign ``self.templates`` to replace the defaults."""
+
+    @property
+    def templates(self) -> Dict[ToneStyle, Dict[str, str]]:
+        # Copied on first access, so editing it never changes the module defaults
+        if self._templates is None:
+            self._templates = {tone: dict(entries) for tone, entries in EXPLANATION_TEMPLATES.items()}
+            for tone, entries in (self._overrides or {}).items():
+                self._templates.setdefault(tone, {}).update(entries)
+        return self._templates
+
+    @templates.setter
+    def templates(self, templates: Dict[ToneStyle, Dict[str, str]]) -> None:
+        self._templates = templates
 
     def generate_explanation(self, reasoning_trace: Dict[str, Any]) -> str:
         components = []
@@ -230,6 +863,11 @@ class ExplanationGenerator:
         
         return " ".join(components)
 
+    def generate_explanations(self, reasoning_traces: List[Dict[str, Any]]) -> List[str]:
+        """Render many reasoning traces in one call."""
+        generate = self.generate_explanation
+        return [generate(trace) for trace in reasoning_traces]
+
     def generate_summary(self, reasoning_trace: Dict[str, Any]) -> str:
         """Generate a one-line summary for quick UI display."""
         evidence = reasoning_trace.get("evidence", [])
@@ -239,8 +877,7 @@ class ExplanationGenerator:
         primary = max(evidence, key=lambda x: x.get("weight", 0))
         key_benefit = primary.get("factor", "general wellness")
         
-        template = self.templates[self.tone]["summary"]
-        return template.format(key_benefit=key_benefit)
+        return self._compiled["summary"].render(key_benefit=key_benefit)
 
     def _generate_context(self, user_state: Dict[str, Any]) -> str:
         if not user_state:
@@ -251,9 +888,9 @@ class ExplanationGenerator:
         sources = user_state.get("sources", ["multiple indicators"])
         
         template_key = f"context_stress_{stress_level}"
-        template = self.templates[self.tone].get(template_key, "")
+        template = self._compiled.get(template_key, _EMPTY_TEMPLATE)
         
-        return template.format(
+        return template.render(
             confidence=confidence,
             sources=", ".join(sources[:3])  # Limit to 3 sources for readability
         )
@@ -277,8 +914,7 @@ class ExplanationGenerator:
         else:
             secondary_text = ""
         
-        template = self.templates[self.tone]["recommendation"]
-        return template.format(
+        return self._compiled["recommendation"].render(
             option=option,
             primary_reason=primary_reason,
             secondary_reasons=secondary_text
@@ -294,19 +930,19 @@ class ExplanationGenerator:
         else:
             template_key = "confidence_low"
         
-        return self.templates[self.tone][template_key]
+        return self._compiled[template_key].render()
 
     def _generate_contradictions(self, contradictions: List[Dict[str, Any]]) -> str:
         if not contradictions:
             return ""
         
         parts = []
-        template = self.templates[self.tone]["contradiction"]
+        template = self._compiled["contradiction"]
         
         for contradiction in contradictions[:2]:  # Limit to 2 most important
             factor = contradiction.get("factor", "conflicting preferences")
             resolution = contradiction.get("resolution", "other factors took precedence")
-            parts.append(template.format(factor=factor, resolution=resolution))
+            parts.append(template.render(factor=factor, resolution=resolution))
         
         return " ".join(parts)
 
@@ -315,176 +951,1887 @@ class ExplanationGenerator:
             return ""
         
         parts = []
-        template = self.templates[self.tone]["filtered"]
+        template = self._compiled["filtered"]
         
         for filtered_item in filtered_out:
             option = filtered_item.get("option", "alternative option")
             reason = filtered_item.get("reason", "did not meet criteria")
-            parts.append(template.format(option=option, reason=reason))
+            parts.append(template.render(option=option, reason=reason))
         
         return " ".join(parts)
 
-# --- 5. Integrated Reasoning Pipeline with Explanations ---
-class RecommendationWithExplanation(NamedTuple):
-    activity: str
-    score: float
-    metadata: Dict[str, Any]
-    rank: int
-    explanation: str
-    summary: str
-    reasoning_trace: Dict[str, Any]
+# --- 6. Declarative Scoring Rules ---
+class ScoringRule(NamedTuple):
+    """One score bonus, applied when ``prop`` was decided as ``truth``.
 
-def recommend_activities_with_explanations(
-    tone: ToneStyle = ToneStyle.NEUTRAL,
-    verbose: bool = True
-) -> List[RecommendationWithExplanation]:
-    """Complete recommendation system with integrated explanations."""
-    
-    if verbose:
-        print("=" * 60)
-        print("🧠 EXPLAINABLE AI REASONING SYSTEM")
-        print("=" * 60)
-    
-    # Step 1: Make logical decisions
-    decisions = {
-        "stressed": decide("Stressed(User)", verbose),
-        "likes_hiking": decide("Likes(Hiking)", verbose),
-        "dislikes_crowds": decide("Dislikes(Crowds)", verbose),
-        "prefers_outdoors": decide("Prefers(Outdoors)", verbose)
+    The bonus is ``metadata[attribute] * confidence * weight`` (or just
+    ``weight`` when ``scaled`` is false). ``min_confidence`` and
+    ``min_value`` are strict lower gates on the decision confidence and the
+    attribute value. ``factor`` labels the evidence factor shown in
+    explanations.
+    """
+    prop: str
+    truth: Belnap
+    attribute: str
+    weight: float
+    factor: str
+    min_confidence: float = None
+    min_value: float = None
+    scaled: bool = True
+
+DEFAULT_SCORING_RULES = (
+    ScoringRule("Stressed(User)", Belnap.T, "stress_relief", 0.4, "stress relief potential", min_confidence=0.7),
+    ScoringRule("Prefers(Outdoors)", Belnap.T, "outdoor", 0.3, "outdoor preference alignment"),
+    ScoringRule("Likes(Hiking)", Belnap.T, "physical", 0.2, "physical activity alignment", min_value=0.5),
+    # Contradiction case: a small flat bonus instead of trusting either side
+    ScoringRule("Likes(Hiking)", Belnap.B, "physical", 0.05, "physical activity (conservative)", scaled=False)
+)
+
+class BoundScoring:
+    """A ``ScoringPolicy`` specialised to one request's decisions.
+
+    Only the rules whose Belnap condition and confidence gate hold are
+    kept, so scoring an activity is a short loop over active terms.
+    """
+    __slots__ = ("base", "terms", "monotone")
+
+    def __init__(self, base: float, terms: Tuple[Tuple[ScoringRule, float], ...], monotone: bool):
+        self.base = base
+        self.terms = terms
+        self.monotone = monotone
+
+    def score(self, metadata: Dict[str, Any]) -> float:
+        score = self.base
+        for rule, confidence in self.terms:
+            value = metadata[rule.attribute]
+            if rule.min_value is not None and not value > rule.min_value:
+                continue
+            score += value * confidence * rule.weight if rule.scaled else rule.weight
+        return score
+
+    def score_activity(self, metadata: Dict[str, Any]) -> Tuple[float, List[Dict[str, Any]]]:
+        """Score one activity that passed the crowd filter, with its evidence factors."""
+        score = self.base
+        evidence_factors = []
+        for rule, confidence in self.terms:
+            value = metadata[rule.attribute]
+            if rule.min_value is not None and not value > rule.min_value:
+                continue
+            contribution = value * confidence * rule.weight if rule.scaled else rule.weight
+            score += contribution
+            evidence_factors.append({
+                "factor": rule.factor,
+                "value": value,
+                "weight": rule.weight,
+                "contribution": contribution
+            })
+        return score, evidence_factors
+
+    def score_columns(self, columns: Dict[str, Any], n: int):
+        """Vectorized ``score`` over attribute arrays of length ``n``."""
+        scores = np.full(n, self.base)
+        for rule, confidence in self.terms:
+            values = columns[rule.attribute]
+            contribution = values * confidence * rule.weight if rule.scaled else rule.weight
+            if rule.min_value is not None:
+                contribution = np.where(values > rule.min_value, contribution, 0.0)
+            scores += contribution
+        return scores
+
+class ScoringPolicy:
+    """A validated, reusable set of ``ScoringRule``s.
+
+    Compiled once; ``bind`` then resolves it against each request's
+    decisions. ``monotone`` (all weights non-negative) lets indexed
+    catalogs bound a block's best score from its attribute maxima;
+    ``attributes`` lists the activity attributes the rules read.
+    """
+
+    def __init__(self, rules: Iterable[ScoringRule] = DEFAULT_SCORING_RULES, base: float = 0.5):
+        self.rules = tuple(rules)
+        self.base = base
+        for rule in self.rules:
+            if not isinstance(rule.truth, Belnap):
+                raise ValueError(f"Rule for {rule.prop} needs a Belnap truth value, got {rule.truth!r}")
+            if not isinstance(rule.weight, (int, float)):
+                raise ValueError(f"Rule for {rule.prop} needs a numeric weight, got {rule.weight!r}")
+        self.monotone = all(rule.weight >= 0 for rule in self.rules)
+        self.attributes = tuple(dict.fromkeys(rule.attribute for rule in self.rules))
+
+    def bind(self, decisions: Dict[str, Decision]) -> BoundScoring:
+        by_prop = {dec.prop: dec for dec in decisions.values()}
+        terms = []
+        for rule in self.rules:
+            dec = by_prop.get(rule.prop)
+            if dec is None or dec.truth != rule.truth:
+                continue
+            if rule.min_confidence is not None and not dec.confidence > rule.min_confidence:
+                continue
+            terms.append((rule, dec.confidence))
+        return BoundScoring(self.base, tuple(terms), self.monotone)
+
+def load_scoring_policy(path: str) -> ScoringPolicy:
+    """Read a JSON scoring policy.
+
+    The file holds ``{"base": 0.5, "rules": [...]}``, where each rule is an
+    object with ``ScoringRule`` field names and ``truth`` is a Belnap member
+    name (``"T"``, ``"F"``, ``"B"`` or ``"N"``).
+    """
+    with open(path, encoding="utf-8") as f:
+        spec = json.load(f)
+    rules = [ScoringRule(**{**rule, "truth": Belnap[rule["truth"]]}) for rule in spec["rules"]]
+    return ScoringPolicy(rules, spec.get("base", 0.5))
+
+DEFAULT_SCORING_POLICY = ScoringPolicy()
+
+# --- 7. Integrated Reasoning Pipeline with Explanations ---
+class _RecommendationContext:
+    """Per-request state shared by every recommendation in a top-k list.
+
+    ``generators`` holds one ``ExplanationGenerator`` per requested tone,
+    primary tone first. ``span`` is the request's span, the parent of the
+    ``explain`` spans recorded when explanations are rendered later.
+    """
+    __slots__ = ("decisions", "filtered_out", "generator", "generators", "span")
+
+    def __init__(
+        self,
+        decisions: Dict[str, Decision],
+        filtered_out: List[Dict[str, str]],
+        generator: ExplanationGenerator,
+        generators: Dict[ToneStyle, ExplanationGenerator] = None,
+        span: Span = None
+    ):
+        self.decisions = decisions
+        self.filtered_out = filtered_out
+        self.generator = generator
+        self.generators = generators or {generator.tone: generator}
+        self.span = span
+
+class RecommendationWithExplanation:
+    """A ranked activity whose reasoning trace and explanations are lazy.
+
+    ``reasoning_trace``, ``explanation`` and ``summary`` are materialized on
+    first access and memoized, so callers that only read ``activity`` and
+    ``score`` never pay for them. The ``filtered_out`` list inside the trace
+    (at most ``FILTERED_OUT_LIMIT`` rejections) is shared by reference
+    across a request's top-k. Field access, indexing, iteration,
+    ``len()``, ``_asdict()``, ``_replace()`` and equality behave like the
+    former NamedTuple.
+
+    ``explanations`` and ``summaries`` map every tone the request was made
+    for to its rendering, all from the one shared trace;
+    ``explanation_for``/``summary_for`` render any other tone on demand.
+
+    Built directly, without a request context, the lazy fields are just
+    the values passed in; reading one that was not given raises
+    ``ValueError``.
+    """
+    __slots__ = ("activity", "score", "metadata", "rank", "_evidence", "_context",
+                 "_reasoning_trace", "_explanation", "_summary", "_rendered")
+    _fields = ("activity", "score", "metadata", "rank", "explanation", "summary", "reasoning_trace")
+
+    def __init__(
+        self,
+        activity: str,
+        score: float,
+        metadata: Dict[str, Any],
+        rank: int,
+        explanation: str = None,
+        summary: str = None,
+        reasoning_trace: Dict[str, Any] = None,
+        *,
+        evidence: List[Dict[str, Any]] = None,
+        context: _RecommendationContext = None
+    ):
+        self.activity = activity
+        self.score = score
+        self.metadata = metadata
+        self.rank = rank
+        self._evidence = evidence
+        self._context = context
+        self._reasoning_trace = reasoning_trace
+        self._explanation = explanation
+        self._summary = summary
+        self._rendered = None
+
+    def _require_context(self, field: str) -> _RecommendationContext:
+        if self._context is None:
+            raise ValueError(
+                f"{field} of {self.activity!r} was not given and there is no request context to render it from"
+            )
+        return self._context
+
+    @property
+    def reasoning_trace(self) -> Dict[str, Any]:
+        if self._reasoning_trace is None:
+            self._require_context("reasoning_trace")
+            self._reasoning_trace = _reasoning_trace(
+                self.activity, self.score, self._evidence,
+                self._context.decisions, self._context.filtered_out
+            )
+        return self._reasoning_trace
+
+    @property
+    def explanation(self) -> str:
+        if self._explanation is None:
+            context = self._require_context("explanation")
+            with instrumentation.span("explain", context.span, activity=self.activity, part="explanation"):
+                self._explanation = context.generator.generate_explanation(self.reasoning_trace)
+        return self._explanation
+
+    @property
+    def summary(self) -> str:
+        if self._summary is None:
+            context = self._require_context("summary")
+            with instrumentation.span("explain", context.span, activity=self.activity, part="summary"):
+                self._summary = context.generator.generate_summary(self.reasoning_trace)
+        return self._summary
+
+    def _render(self, part: str, tone: ToneStyle) -> str:
+        if self._context is not None and tone == self._context.generator.tone:
+            return getattr(self, part)
+        if self._rendered is None:
+            self._rendered = {}
+        key = (part, tone)
+        if key not in self._rendered:
+            generator = self._context.generators.get(tone) if self._context is not None else None
+            generator = generator or ExplanationGenerator(tone)
+            render = generator.generate_explanation if part == "explanation" else generator.generate_summary
+            parent = self._context.span if self._context is not None else None
+            with instrumentation.span("explain", parent, activity=self.activity, part=part, tone=tone.value):
+                self._rendered[key] = render(self.reasoning_trace)
+        return self._rendered[key]
+
+    def explanation_for(self, tone: ToneStyle) -> str:
+        return self._render("explanation", tone)
+
+    def summary_for(self, tone: ToneStyle) -> str:
+        return self._render("summary", tone)
+
+    @property
+    def tones(self) -> List[ToneStyle]:
+        return list(self._context.generators) if self._context is not None else []
+
+    @property
+    def explanations(self) -> Dict[ToneStyle, str]:
+        return {tone: self.explanation_for(tone) for tone in self.tones}
+
+    @property
+    def summaries(self) -> Dict[ToneStyle, str]:
+        return {tone: self.summary_for(tone) for tone in self.tones}
+
+    def __iter__(self) -> Iterator[Any]:
+        return (getattr(self, field) for field in self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(getattr(self, field) for field in self._fields[index])
+        return getattr(self, self._fields[index])
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, RecommendationWithExplanation):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    __hash__ = None
+
+    def _asdict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in self._fields}
+
+    def _replace(self, **changes: Any) -> "RecommendationWithExplanation":
+        unknown = [name for name in changes if name not in self._fields]
+        if unknown:
+            raise ValueError(f"Got unexpected field names: {unknown!r}")
+        if changes.keys() & {"activity", "score", "reasoning_trace"}:
+            # The lazy fields derive from these; freeze them first, as a NamedTuple would
+            values = self._asdict()
+        else:
+            values = {
+                "activity": self.activity, "score": self.score, "metadata": self.metadata, "rank": self.rank,
+                "explanation": self._explanation, "summary": self._summary, "reasoning_trace": self._reasoning_trace
+            }
+        values.update(changes)
+        return RecommendationWithExplanation(**values, evidence=self._evidence, context=self._context)
+
+    def __repr__(self) -> str:
+        return f"RecommendationWithExplanation(activity={self.activity!r}, score={self.score!r}, rank={self.rank!r})"
+
+DECISION_PROPS = {
+    "stressed": "Stressed(User)",
+    "likes_hiking": "Likes(Hiking)",
+    "dislikes_crowds": "Dislikes(Crowds)",
+    "prefers_outdoors": "Prefers(Outdoors)"
+}
+
+def _make_decisions(
+    verbose: bool = False,
+    store: DecisionStore = None,
+    evidence: Dict[str, List[Evidence]] = None
+) -> Dict[str, Decision]:
+    """Resolve the four propositions the recommender depends on.
+
+    With a ``store`` the cached incremental decisions are read instead of
+    re-running ``decide`` over the evidence lists; otherwise ``evidence``
+    (default ``evidence_db``) is decided directly.
+    """
+    if store is not None:
+        return {key: store.decision(prop) for key, prop in DECISION_PROPS.items()}
+    return {key: decide(prop, verbose, evidence) for key, prop in DECISION_PROPS.items()}
+
+# Rejections kept in a reasoning trace (in catalog order); explanations read two
+FILTERED_OUT_LIMIT = 10
+
+def _crowd_threshold(decisions: Dict[str, Decision]) -> float:
+    """Crowd tolerance shrinks as confidence in Dislikes(Crowds) grows."""
+    return 0.5 - (decisions["dislikes_crowds"].confidence * 0.3)
+
+def _crowd_reason(crowd_level: float, adaptive_threshold: float) -> str:
+    return f"crowdiness level ({crowd_level:.1f}) exceeds tolerance threshold ({adaptive_threshold:.2f})"
+
+def _reasoning_trace(
+    activity: str,
+    score: float,
+    evidence: List[Dict[str, Any]],
+    decisions: Dict[str, Decision],
+    filtered_out: List[Dict[str, str]]
+) -> Dict[str, Any]:
+    contradictions = []
+    if decisions["likes_hiking"].truth == Belnap.B:
+        contradictions.append({
+            "factor": "mixed feelings about hiking activities",
+            "resolution": "conservative approach taken due to other strong factors"
+        })
+    
+    user_state = {
+        "stress_level": "high" if decisions["stressed"].truth == Belnap.T and decisions["stressed"].confidence > 0.8 else "moderate",
+        "confidence": decisions["stressed"].confidence,
+        "sources": ["heart rate monitor", "journal entries", "sleep patterns"]
     }
     
-    if verbose:
-        print(f"\n📊 DECISIONS SUMMARY:")
-        for key, dec in decisions.items():
-            print(f"  {key}: {dec.truth.value} (conf={dec.confidence:.2f})")
+    return {
+        "decision": f"Recommend {activity}",
+        "confidence": min(score / 2.0, 1.0),  # Normalize to [0,1]
+        "user_state": user_state,
+        "evidence": evidence,
+        "contradictions": contradictions,
+        "filtered_out": filtered_out
+    }
+
+def _build_recommendations(
+    scored_activities: List[Tuple[str, float, Dict[str, Any], List[Dict[str, Any]]]],
+    decisions: Dict[str, Decision],
+    filtered_out: List[Dict[str, str]],
+    tone: ToneStyle,
+    verbose: bool,
+    tones: Iterable[ToneStyle] = None
+) -> List[RecommendationWithExplanation]:
+    """Wrap already-ranked activities; traces and explanations render on demand."""
+    generator = ExplanationGenerator(tone)
+    generators = {tone: generator}
+    for extra in tones or ():
+        generators.setdefault(extra, ExplanationGenerator(extra))
+    context = _RecommendationContext(decisions, filtered_out, generator, generators, _current_span.get())
+    recommendations = []
+    emit = instrumentation.emitter(verbose)
     
-    # Step 2: Apply filtering and scoring
-    candidate_activities = list(activities_db.items())
-    filtered_out = []
-    scored_activities = []
+    for i, (activity, score, metadata, evidence) in enumerate(scored_activities):
+        recommendation = RecommendationWithExplanation(
+            activity=activity,
+            score=score,
+            metadata=metadata,
+            rank=i + 1,
+            evidence=evidence,
+            context=context
+        )
+        
+        recommendations.append(recommendation)
+        
+        if emit:
+            emit("recommendation", recommendation=recommendation)
+    
+    return recommendations
+
+def _score_candidates(
+    activities: Iterable[Tuple[str, Dict[str, Any]]],
+    decisions: Dict[str, Decision],
+    filtered_out: List[Dict[str, str]],
+    verbose: bool,
+    scorer: BoundScoring,
+    timings: Dict[str, int] = None
+) -> Iterator[Tuple[str, float, Dict[str, Any], List[Dict[str, Any]]]]:
+    """Lazily crowd-filter and score activities.
+
+    The first ``FILTERED_OUT_LIMIT`` rejections are recorded in
+    ``filtered_out``; the rest are only counted. With ``timings`` the
+    nanoseconds spent filtering and scoring are added to its ``"filter"``
+    and ``"score"`` entries.
+    """
+    adaptive_threshold = _crowd_threshold(decisions)
+    emit = instrumentation.emitter(verbose)
+    clock = time.perf_counter_ns if timings is not None else None
+    passed = filtered = 0
     
-    for activity, metadata in candidate_activities:
+    for activity, metadata in activities:
+        if clock:
+            started = clock()
+        
         # Crowd filtering
         crowd_level = metadata["crowdiness"]
-        dislike_confidence = decisions["dislikes_crowds"].confidence
-        adaptive_threshold = 0.5 - (dislike_confidence * 0.3)
         
         if crowd_level > adaptive_threshold:
-            reason = f"crowdiness level ({crowd_level:.1f}) exceeds tolerance threshold ({adaptive_threshold:.2f})"
-            filtered_out.append({"option": activity, "reason": reason})
-            if verbose:
-                print(f"  ❌ {activity} filtered: {reason}")
+            filtered += 1
+            keep = len(filtered_out) < FILTERED_OUT_LIMIT
+            if keep or emit:
+                reason = _crowd_reason(crowd_level, adaptive_threshold)
+                if keep:
+                    filtered_out.append({"option": activity, "reason": reason})
+                if emit:
+                    emit("filtered", activity=activity, reason=reason)
+            if clock:
+                timings["filter"] += clock() - started
             continue
         
-        if verbose:
-            print(f"  ✅ {activity} passed crowd filter")
+        if emit:
+            emit("passed", activity=activity)
         
         # Calculate score
-        base_score = 0.5
-        evidence_factors = []
-        
-        # Stress relief bonus
-        if decisions["stressed"].truth == Belnap.T and decisions["stressed"].confidence > 0.7:
-            stress_bonus = metadata["stress_relief"] * decisions["stressed"].confidence * 0.4
-            base_score += stress_bonus
-            evidence_factors.append({
-                "factor": "stress relief potential",
-                "value": metadata["stress_relief"],
-                "weight": 0.4,
-                "contribution": stress_bonus
-            })
-        
-        # Outdoor preference bonus
-        if decisions["prefers_outdoors"].truth == Belnap.T:
-            outdoor_bonus = metadata["outdoor"] * decisions["prefers_outdoors"].confidence * 0.3
-            base_score += outdoor_bonus
-            evidence_factors.append({
-                "factor": "outdoor preference alignment",
-                "value": metadata["outdoor"],
-                "weight": 0.3,
-                "contribution": outdoor_bonus
-            })
-        
-        # Hiking preference (with contradiction handling)
-        hiking_decision = decisions["likes_hiking"]
-        if hiking_decision.truth == Belnap.T and metadata["physical"] > 0.5:
-            hiking_bonus = metadata["physical"] * hiking_decision.confidence * 0.2
-            base_score += hiking_bonus
-            evidence_factors.append({
-                "factor": "physical activity alignment",
-                "value": metadata["physical"],
-                "weight": 0.2,
-                "contribution": hiking_bonus
-            })
-        elif hiking_decision.truth == Belnap.B:  # Contradiction case
-            small_bonus = 0.05
-            base_score += small_bonus
-            evidence_factors.append({
-                "factor": "physical activity (conservative)",
-                "value": metadata["physical"],
-                "weight": 0.05,
-                "contribution": small_bonus
-            })
-        
-        scored_activities.append((activity, base_score, metadata, evidence_factors))
+        passed += 1
+        if clock:
+            filtered_at = clock()
+            timings["filter"] += filtered_at - started
+        base_score, evidence_factors = scorer.score_activity(metadata)
+        if clock:
+            timings["score"] += clock() - filtered_at
+        yield activity, base_score, metadata, evidence_factors
     
-    # Step 3: Generate recommendations with explanations
-    scored_activities.sort(key=lambda x: x[1], reverse=True)
-    generator = ExplanationGenerator(tone)
-    recommendations = []
+    if instrumentation.enabled:
+        instrumentation.count("activities.passed", passed)
+        instrumentation.count("activities.filtered", filtered)
+
+def select_top_k(scored_activities: Iterable[Tuple], k: int) -> List[Tuple]:
+    """Best ``k`` scored tuples, highest score first, in O(k) memory.
+
+    Uses a bounded heap over any iterable; ties keep their arrival order,
+    exactly like a stable ``sort(key=score, reverse=True)``.
+    """
+    if k <= 0:
+        return []
+    return heapq.nsmallest(k, scored_activities, key=lambda x: -x[1])
+
+def _recommend_from_decisions(
+    decisions: Dict[str, Decision],
+    tone: ToneStyle,
+    verbose: bool,
+    top_k: int,
+    activities: Iterable[Tuple[str, Dict[str, Any]]],
+    scoring: ScoringPolicy = None,
+    tones: Iterable[ToneStyle] = None
+) -> List[RecommendationWithExplanation]:
+    """Filter, score, rank and explain once the decisions are known."""
+    scorer = (scoring or DEFAULT_SCORING_POLICY).bind(decisions)
+    emit = instrumentation.emitter(verbose)
+    if emit:
+        emit("decisions", decisions=decisions)
+    _record_decisions(decisions)
     
-    for i, (activity, score, metadata, evidence) in enumerate(scored_activities[:3]):
-        # Build reasoning trace
-        contradictions = []
-        if decisions["likes_hiking"].truth == Belnap.B:
-            contradictions.append({
-                "factor": "mixed feelings about hiking activities",
-                "resolution": "conservative approach taken due to other strong factors"
-            })
+    # Step 2: Apply filtering and scoring (streamed straight into the top-k heap)
+    if activities is None:
+        activities = activities_db.items()
+    filtered_out = []
+    timings = {"filter": 0, "score": 0} if instrumentation.enabled else None
+    with instrumentation.span("rank", streamed=True, k=top_k) as rank:
+        scored_activities = _score_candidates(activities, decisions, filtered_out, verbose, scorer, timings)
+        top_activities = select_top_k(scored_activities, top_k)
+        if timings is not None:
+            _record_stream_timings(rank, timings)
+    
+    # Step 3: Generate recommendations; explanations render (and record
+    # their "explain" spans under this request) when first read
+    recommendations = _build_recommendations(top_activities, decisions, filtered_out, tone, verbose, tones)
+    
+    if emit:
+        emit("pipeline_end")
+    
+    return recommendations
+
+def _record_stream_timings(rank: Span, timings: Dict[str, int]) -> None:
+    """Split a streamed ``rank`` stage into ``filter``, ``score`` and ``sort`` child spans.
+
+    Filtering and scoring interleave row by row, so their accumulated
+    times are laid out back to back from the stage start; ``sort`` is the
+    remainder (heap upkeep and iterating the catalog).
+    """
+    elapsed = time.time_ns() - rank.start_ns
+    start = rank.start_ns
+    for stage in ("filter", "score"):
+        instrumentation.record_span(stage, start, timings[stage], accumulated=True)
+        start += timings[stage]
+    instrumentation.record_span("sort", start, max(0, elapsed - timings["filter"] - timings["score"]), accumulated=True)
+
+def _emit_crowd_filter(
+    emit: Callable[..., None],
+    names: Iterable[str],
+    crowd_levels: Iterable[float],
+    adaptive_threshold: float
+) -> None:
+    """Emit the row-wise pipeline's ``filtered``/``passed`` events, in catalog order.
+
+    Used by the vectorized and indexed paths, which never visit the rows
+    one by one, so their event stream matches ``_score_candidates``.
+    """
+    for activity, crowd_level in zip(names, crowd_levels):
+        if crowd_level > adaptive_threshold:
+            emit("filtered", activity=activity, reason=_crowd_reason(crowd_level, adaptive_threshold))
+        else:
+            emit("passed", activity=activity)
+
+def _record_decisions(decisions: Dict[str, Decision]) -> None:
+    """Add the request's verdicts to the Belnap histogram counters."""
+    if instrumentation.enabled:
+        for dec in decisions.values():
+            instrumentation.count(f"decisions.verdict.{dec.truth.name}")
+
+def recommend_activities_with_explanations(
+    tone: ToneStyle = ToneStyle.NEUTRAL,
+    verbose: bool = True,
+    store: DecisionStore = None,
+    top_k: int = 3,
+    activities: Iterable[Tuple[str, Dict[str, Any]]] = None,
+    evidence: Dict[str, List[Evidence]] = None,
+    scoring: ScoringPolicy = None
+) -> List[RecommendationWithExplanation]:
+    """Complete recommendation system with integrated explanations.
+
+    Pass a ``DecisionStore`` to read its cached decisions instead of
+    recomputing them from ``evidence`` (default ``evidence_db``).
+    ``activities`` may be any iterable of ``(name, metadata)`` pairs
+    (defaults to ``activities_db``); candidates are streamed through a heap
+    of size ``top_k``. ``scoring`` replaces the default bonus rules.
+    """
+    emit = instrumentation.emitter(verbose)
+    if emit:
+        emit("pipeline_start")
+    
+    with instrumentation.span("recommend", tone=tone.value, top_k=top_k):
+        # Step 1: Make logical decisions
+        with instrumentation.span("decide"):
+            decisions = _make_decisions(verbose, store, evidence)
         
-        user_state = {
-            "stress_level": "high" if decisions["stressed"].truth == Belnap.T and decisions["stressed"].confidence > 0.8 else "moderate",
-            "confidence": decisions["stressed"].confidence,
-            "sources": ["heart rate monitor", "journal entries", "sleep patterns"]
-        }
+        return _recommend_from_decisions(decisions, tone, verbose, top_k, activities, scoring)
+
+def recommend_activities_multi_tone(
+    tones: Iterable[ToneStyle] = tuple(ToneStyle),
+    verbose: bool = False,
+    store: DecisionStore = None,
+    top_k: int = 3,
+    activities: Iterable[Tuple[str, Dict[str, Any]]] = None,
+    evidence: Dict[str, List[Evidence]] = None,
+    scoring: ScoringPolicy = None
+) -> List[RecommendationWithExplanation]:
+    """Recommend once and render explanations for several tones.
+
+    Decisions, filtering, scoring and the reasoning traces are computed a
+    single time; each recommendation's ``explanations`` and ``summaries``
+    map every tone in ``tones`` to its text. ``explanation``/``summary``
+    use the first tone. Other arguments are as for
+    ``recommend_activities_with_explanations``.
+    """
+    tones = list(dict.fromkeys(tones))
+    if not tones:
+        raise ValueError("at least one tone is required")
+    emit = instrumentation.emitter(verbose)
+    if emit:
+        emit("pipeline_start")
+    
+    with instrumentation.span("recommend", tone=",".join(t.value for t in tones), top_k=top_k):
+        with instrumentation.span("decide"):
+            decisions = _make_decisions(verbose, store, evidence)
         
-        reasoning_trace = {
-            "decision": f"Recommend {activity}",
-            "confidence": min(score / 2.0, 1.0),  # Normalize to [0,1]
-            "user_state": user_state,
-            "evidence": evidence,
-            "contradictions": contradictions,
-            "filtered_out": filtered_out
+        return _recommend_from_decisions(decisions, tones[0], verbose, top_k, activities, scoring, tones)
+
+# --- 8. Columnar Scoring for Large Catalogs ---
+ACTIVITY_ATTRIBUTES = ("crowdiness", "outdoor", "physical", "stress_relief")
+
+class ActivityColumns:
+    """Column-oriented copy of an activity catalog for vectorized scoring.
+
+    Each attribute in ``attributes`` (default ``ACTIVITY_ATTRIBUTES``) is
+    held as a float64 array aligned with ``names``. When built from a dict
+    the original metadata dicts are kept, so the top-k recommendations
+    carry the same objects as the row-wise pipeline and any other
+    attribute a scoring policy reads gets its column on first use;
+    catalogs loaded from disk have exactly the columns that were saved.
+    """
+
+    def __init__(self, names: List[str], metadata: List[Dict[str, Any]], columns: Dict[str, Any]):
+        self.names = names
+        self.metadata = metadata
+        self.columns = columns
+
+    @classmethod
+    def from_dict(
+        cls,
+        activities: Dict[str, Dict[str, Any]],
+        attributes: Iterable[str] = ACTIVITY_ATTRIBUTES
+    ) -> "ActivityColumns":
+        if np is None:
+            raise ImportError("numpy is required for columnar scoring")
+        names = list(activities)
+        columns = cls(names, [activities[name] for name in names], {})
+        for attr in dict.fromkeys(attributes):
+            columns.column(attr)
+        return columns
+
+    def column(self, attr: str):
+        """The float64 array for ``attr``, built from the metadata the first time it is asked for."""
+        values = self.columns.get(attr)
+        if values is None:
+            if self.metadata is None:
+                raise ValueError(f"catalog has no {attr!r} column; save it with that attribute included")
+            values = np.fromiter((m[attr] for m in self.metadata), dtype=np.float64, count=len(self.metadata))
+            self.columns[attr] = values
+        return values
+
+    def save(self, directory: str) -> None:
+        """Write names and one ``.npy`` file per attribute into ``directory``."""
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "names.json"), "w", encoding="utf-8") as f:
+            json.dump(self.names, f)
+        for attr, values in self.columns.items():
+            np.save(os.path.join(directory, f"{attr}.npy"), values)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "ActivityColumns":
+        """Load a saved catalog; with ``mmap`` the arrays are memory-mapped read-only."""
+        if np is None:
+            raise ImportError("numpy is required for columnar scoring")
+        with open(os.path.join(directory, "names.json"), encoding="utf-8") as f:
+            names = json.load(f)
+        columns = {
+            entry[:-len(".npy")]: np.load(os.path.join(directory, entry), mmap_mode="r" if mmap else None)
+            for entry in sorted(os.listdir(directory))
+            if entry.endswith(".npy")
+        }
+        return cls(names, None, columns)
+
+    def metadata_at(self, i: int) -> Dict[str, Any]:
+        if self.metadata is not None:
+            return self.metadata[i]
+        return {attr: float(values[i]) for attr, values in self.columns.items()}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+def _score_columns(columns: ActivityColumns, decisions: Dict[str, Decision], scorer: BoundScoring):
+    """Vectorized crowd filter and scoring; returns (pass mask, scores)."""
+    passed = ~(columns.column("crowdiness") > _crowd_threshold(decisions))
+    values = {rule.attribute: columns.column(rule.attribute) for rule, _ in scorer.terms}
+    return passed, scorer.score_columns(values, len(columns))
+
+def _top_k_indices(scores, candidates, k: int):
+    """Indices of the k best candidates, ties broken by catalog order like ``list.sort``."""
+    if k <= 0 or len(candidates) == 0:
+        return candidates[:0]
+    cand_scores = scores[candidates]
+    if len(candidates) > k:
+        # Keep everything tied with the k-th best so the tie-break stays exact
+        kth = np.partition(cand_scores, len(candidates) - k)[len(candidates) - k]
+        keep = cand_scores >= kth
+        candidates, cand_scores = candidates[keep], cand_scores[keep]
+    order = np.lexsort((candidates, -cand_scores))
+    return candidates[order[:k]]
+
+class ColumnarFilteredOutView(Sequence):
+    """Lazy ``filtered_out`` list for a columnar query.
+
+    Holds only the indices of the first ``FILTERED_OUT_LIMIT`` rejected
+    rows; like ``FilteredOutView``, an ``{"option", "reason"}`` entry is
+    built when it is read.
+    """
+    __slots__ = ("_columns", "_indices", "_threshold")
+
+    def __init__(self, columns: ActivityColumns, indices, threshold: float):
+        self._columns = columns
+        self._indices = indices
+        self._threshold = threshold
+
+    def _entry(self, i: int) -> Dict[str, str]:
+        return {
+            "option": self._columns.names[i],
+            "reason": _crowd_reason(float(self._columns.column("crowdiness")[i]), self._threshold)
         }
+
+    def __len__(self) -> int:
+        return len(self._indices)
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        return (self._entry(i) for i in self._indices.tolist())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._entry(i) for i in self._indices[index].tolist()]
+        return self._entry(int(self._indices[index]))
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, (list, Sequence)) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and list(self) == list(other)
+
+    __hash__ = None
+
+def _recommend_columnar_from_decisions(
+    decisions: Dict[str, Decision],
+    columns: ActivityColumns,
+    tone: ToneStyle,
+    top_k: int,
+    verbose: bool,
+    scoring: ScoringPolicy = None
+) -> List[RecommendationWithExplanation]:
+    emit = instrumentation.emitter(verbose)
+    if emit:
+        emit("decisions", decisions=decisions)
+    _record_decisions(decisions)
+    scorer = (scoring or DEFAULT_SCORING_POLICY).bind(decisions)
+    with instrumentation.span("score", activities=len(columns)):
+        passed, scores = _score_columns(columns, decisions, scorer)
+    
+    with instrumentation.span("filter"):
+        rejected = np.flatnonzero(~passed)
+        filtered_out = ColumnarFilteredOutView(columns, rejected[:FILTERED_OUT_LIMIT], _crowd_threshold(decisions))
+    if emit:
+        _emit_crowd_filter(emit, columns.names, columns.column("crowdiness").tolist(), _crowd_threshold(decisions))
+    if instrumentation.enabled:
+        instrumentation.count("activities.filtered", len(rejected))
+        instrumentation.count("activities.passed", len(columns) - len(rejected))
+    
+    with instrumentation.span("sort", k=top_k):
+        top_indices = _top_k_indices(scores, np.flatnonzero(passed), top_k).tolist()
+    
+    with instrumentation.span("evidence", recommendations=len(top_indices)):
+        scored_activities = []
+        for i in top_indices:
+            metadata = columns.metadata_at(i)
+            _, evidence_factors = scorer.score_activity(metadata)
+            scored_activities.append((columns.names[i], float(scores[i]), metadata, evidence_factors))
+    
+    recommendations = _build_recommendations(scored_activities, decisions, filtered_out, tone, verbose)
+    if emit:
+        emit("pipeline_end")
+    return recommendations
+
+def recommend_activities_columnar(
+    tone: ToneStyle = ToneStyle.NEUTRAL,
+    columns: ActivityColumns = None,
+    top_k: int = 3,
+    verbose: bool = False,
+    store: DecisionStore = None,
+    evidence: Dict[str, List[Evidence]] = None,
+    scoring: ScoringPolicy = None
+) -> List[RecommendationWithExplanation]:
+    """Columnar variant of ``recommend_activities_with_explanations``.
+
+    The crowd filter, bonuses and ranking run as array operations over the
+    whole catalog; evidence factors and explanations are only built for the
+    top-k activities, and ``filtered_out`` is a lazy view over the rejected
+    rows.
+    """
+    if columns is None:
+        columns = ActivityColumns.from_dict(activities_db)
+    emit = instrumentation.emitter(verbose)
+    if emit:
+        emit("pipeline_start")
+    
+    with instrumentation.span("recommend_columnar", tone=tone.value, top_k=top_k):
+        with instrumentation.span("decide"):
+            decisions = _make_decisions(verbose, store, evidence)
+        return _recommend_columnar_from_decisions(decisions, columns, tone, top_k, verbose, scoring)
+
+PARITY_SEEDS = (0, 1, 2)
+PARITY_TOP_K = (1, 3, 10, 50)
+# Also reads "price", which catalogs only index once a policy asks for it
+PARITY_SCORING = ScoringPolicy(DEFAULT_SCORING_RULES + (
+    ScoringRule("Prefers(Outdoors)", Belnap.T, "price", 0.15, "value for money", min_value=0.3),
+    ScoringRule("Prefers(Outdoors)", Belnap.B, "price", 0.1, "value for money (conservative)", scaled=False)
+))
+
+def _parity_cases(
+    seeds: Iterable[int],
+    n_activities: int = 300
+) -> Iterator[Tuple[Dict[str, Dict[str, Any]], Dict[str, List[Evidence]]]]:
+    """``(activities, evidence)`` pairs the fast pipelines must agree on.
+
+    Each seed gives the benchmark catalog and a tie-heavy one whose
+    attributes take only three values, with every seventh crowdiness set
+    exactly at the request's crowd threshold. Both carry a ``price``
+    attribute for ``PARITY_SCORING``.
+    """
+    for seed in seeds:
+        evidence = synthetic_evidence_db(3, seed)
+        rng = random.Random(seed)
+        yield {
+            name: {**metadata, "price": round(rng.random(), 2)}
+            for name, metadata in synthetic_activities_db(n_activities, seed).items()
+        }, evidence
+        threshold = _crowd_threshold(_make_decisions(evidence=evidence))
+        tied = {}
+        for i in range(n_activities):
+            metadata = {attr: rng.choice((0.2, 0.4, 0.6)) for attr in (*ACTIVITY_ATTRIBUTES, "price")}
+            if i % 7 == 0:
+                metadata["crowdiness"] = threshold
+            tied[f"Tied{i:05d}"] = metadata
+        yield tied, evidence
+
+def _matches_reference(
+    prepare: Callable[[Dict[str, Dict[str, Any]]], Any],
+    recommend: Callable[[Any, Dict[str, List[Evidence]], int, ScoringPolicy], List[RecommendationWithExplanation]],
+    tone: ToneStyle,
+    seeds: Iterable[int]
+) -> bool:
+    """Compare ``recommend(prepare(activities), evidence, k, scoring)`` with the row-wise pipeline.
+
+    Runs the demo data at ``k=3`` and every ``_parity_cases`` catalog at
+    each ``PARITY_TOP_K``, under both the default policy and
+    ``PARITY_SCORING``. Recommendations compare field by field, so the
+    names, scores, tie order and ``filtered_out`` entries must all match.
+    """
+    cases = [(activities_db, None, (3,), (None,))]
+    cases += [(a, e, PARITY_TOP_K, (None, PARITY_SCORING)) for a, e in _parity_cases(seeds)]
+    for activities, evidence, ks, policies in cases:
+        prepared = prepare(activities)
+        for scoring, k in itertools.product(policies, ks):
+            expected = recommend_activities_with_explanations(
+                tone=tone, verbose=False, top_k=k, activities=activities.items(), evidence=evidence, scoring=scoring
+            )
+            if recommend(prepared, evidence, k, scoring) != expected:
+                return False
+    return True
+
+def verify_columnar_parity(tone: ToneStyle = ToneStyle.NEUTRAL, seeds: Iterable[int] = PARITY_SEEDS) -> bool:
+    """Check that the columnar pipeline reproduces the row-wise one exactly."""
+    return _matches_reference(
+        ActivityColumns.from_dict,
+        lambda columns, evidence, k, scoring: recommend_activities_columnar(
+            tone, columns, k, evidence=evidence, scoring=scoring
+        ),
+        tone, seeds
+    )
+
+# --- 9. Indexed Activity Catalog ---
+class FilteredOutView(Sequence):
+    """Lazy ``filtered_out`` list for an ``ActivityCatalog`` query.
+
+    Yields the same ``{"option", "reason"}`` dicts as the row-wise pipeline
+    (the first ``FILTERED_OUT_LIMIT`` rejections, in catalog order), but
+    only builds the entries that are actually read.
+    """
+    __slots__ = ("_catalog", "_cutoff", "_threshold")
+
+    def __init__(self, catalog: "ActivityCatalog", cutoff: int, threshold: float):
+        self._catalog = catalog
+        self._cutoff = cutoff
+        self._threshold = threshold
+
+    def __len__(self) -> int:
+        return min(len(self._catalog) - self._cutoff, FILTERED_OUT_LIMIT)
+
+    def __iter__(self) -> Iterator[Dict[str, str]]:
+        catalog, cutoff, remaining = self._catalog, self._cutoff, len(self)
+        for i, position in enumerate(catalog.crowd_positions):
+            if not remaining:
+                return
+            if position >= cutoff:
+                remaining -= 1
+                yield {
+                    "option": catalog.names[i],
+                    "reason": _crowd_reason(catalog.metadata[i]["crowdiness"], self._threshold)
+                }
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            return list(itertools.islice(self, start, stop, step))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("filtered_out index out of range")
+        return next(itertools.islice(self, index, None))
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, (list, FilteredOutView)):
+            return NotImplemented
+        return len(self) == len(other) and list(self) == list(other)
+
+    __hash__ = None
+
+class ActivityCatalog:
+    """Activity catalog indexed for sublinear filtering and top-k scoring.
+
+    Every attribute in ``attributes`` (default ``ACTIVITY_ATTRIBUTES``) has
+    a sorted index for range queries. Activities are also laid out in
+    crowdiness order and grouped into blocks of ``block_size`` that record
+    each attribute's maximum, so a query can bisect to the activities under
+    the crowd threshold and skip whole blocks whose best possible score
+    cannot reach the current top-k. Other attributes are indexed the first
+    time a query or scoring policy reads them.
+    """
+
+    def __init__(
+        self,
+        activities: Dict[str, Dict[str, Any]],
+        block_size: int = 256,
+        attributes: Iterable[str] = ACTIVITY_ATTRIBUTES
+    ):
+        self.names = list(activities)
+        self.metadata = [activities[name] for name in self.names]
+        self.block_size = block_size
         
-        # Generate explanations
-        explanation = generator.generate_explanation(reasoning_trace)
-        summary = generator.generate_summary(reasoning_trace)
+        self.crowd_order = sorted(range(len(self.names)), key=lambda i: (self.metadata[i]["crowdiness"], i))
+        self.crowd_positions = [0] * len(self.names)
+        for position, i in enumerate(self.crowd_order):
+            self.crowd_positions[i] = position
         
-        recommendation = RecommendationWithExplanation(
-            activity=activity,
-            score=score,
-            metadata=metadata,
-            rank=i + 1,
-            explanation=explanation,
-            summary=summary,
-            reasoning_trace=reasoning_trace
+        self._sorted = {}
+        self._block_max = [{} for _ in range(0, len(self.crowd_order), block_size)]
+        for attr in dict.fromkeys(("crowdiness", *attributes)):
+            self._index(attr)
+        self.crowd_keys = self._sorted["crowdiness"][0]
+
+    def _index(self, attr: str) -> None:
+        """Build ``attr``'s sorted index and per-block maxima."""
+        if attr == "crowdiness":
+            order = self.crowd_order
+        else:
+            order = sorted(range(len(self.names)), key=lambda i: (self.metadata[i][attr], i))
+        self._sorted[attr] = ([self.metadata[i][attr] for i in order], order)
+        for b, block in enumerate(self._block_max):
+            start = b * self.block_size
+            block[attr] = max(self.metadata[i][attr] for i in self.crowd_order[start:start + self.block_size])
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def range(self, attr: str, low: float = None, high: float = None) -> List[str]:
+        """Names with ``low <= metadata[attr] <= high`` (either bound optional)."""
+        if attr not in self._sorted:
+            self._index(attr)
+        keys, order = self._sorted[attr]
+        start = 0 if low is None else bisect.bisect_left(keys, low)
+        stop = len(keys) if high is None else bisect.bisect_right(keys, high)
+        return [self.names[i] for i in order[start:stop]]
+
+    def crowd_cutoff(self, adaptive_threshold: float) -> int:
+        """Number of activities that pass the crowd filter (a prefix of ``crowd_order``)."""
+        return bisect.bisect_right(self.crowd_keys, adaptive_threshold)
+
+    def top_k(
+        self,
+        decisions: Dict[str, Decision],
+        k: int,
+        scoring: ScoringPolicy = None
+    ) -> Tuple[List[Tuple[str, float, Dict[str, Any], List[Dict[str, Any]]]], int]:
+        """Best ``k`` crowd-passing activities and the crowd cutoff.
+
+        Blocks are visited in decreasing order of their score bound and the
+        scan stops once no remaining block can beat the k-th best score, so
+        the result (and its tie order) matches the exhaustive scan. Bounds
+        need a monotone policy; otherwise every passing block is scanned.
+        """
+        scoring = scoring or DEFAULT_SCORING_POLICY
+        for attr in scoring.attributes:
+            if attr not in self._sorted:
+                self._index(attr)
+        scorer = scoring.bind(decisions)
+        cutoff = self.crowd_cutoff(_crowd_threshold(decisions))
+        if k <= 0 or cutoff == 0:
+            return [], cutoff
+        
+        n_blocks = (cutoff + self.block_size - 1) // self.block_size
+        bounds = sorted(
+            ((scorer.score(self._block_max[b]) if scorer.monotone else math.inf, b) for b in range(n_blocks)),
+            reverse=True
         )
+        best = []  # min-heap of (score, -index): the worst of the current top-k on top
+        for bound, b in bounds:
+            if len(best) == k and bound < best[0][0]:
+                break
+            for i in self.crowd_order[b * self.block_size:min((b + 1) * self.block_size, cutoff)]:
+                entry = (scorer.score(self.metadata[i]), -i)
+                if len(best) < k:
+                    heapq.heappush(best, entry)
+                elif entry > best[0]:
+                    heapq.heapreplace(best, entry)
         
-        recommendations.append(recommendation)
+        scored_activities = []
+        for score, neg_i in sorted(best, reverse=True):
+            metadata = self.metadata[-neg_i]
+            _, evidence_factors = scorer.score_activity(metadata)
+            scored_activities.append((self.names[-neg_i], score, metadata, evidence_factors))
+        return scored_activities, cutoff
+
+def recommend_activities_indexed(
+    tone: ToneStyle = ToneStyle.NEUTRAL,
+    catalog: ActivityCatalog = None,
+    top_k: int = 3,
+    verbose: bool = False,
+    store: DecisionStore = None,
+    evidence: Dict[str, List[Evidence]] = None,
+    scoring: ScoringPolicy = None
+) -> List[RecommendationWithExplanation]:
+    """``recommend_activities_with_explanations`` over an ``ActivityCatalog``.
+
+    The crowd filter is a bisection and ``filtered_out`` a lazy view, so a
+    request touches only the blocks that can still reach the top-k.
+    """
+    if catalog is None:
+        catalog = ActivityCatalog(activities_db)
+    emit = instrumentation.emitter(verbose)
+    if emit:
+        emit("pipeline_start")
+    
+    with instrumentation.span("recommend_indexed", tone=tone.value, top_k=top_k):
+        with instrumentation.span("decide"):
+            decisions = _make_decisions(verbose, store, evidence)
+        if emit:
+            emit("decisions", decisions=decisions)
+        _record_decisions(decisions)
+        
+        with instrumentation.span("score", k=top_k):
+            scored_activities, cutoff = catalog.top_k(decisions, top_k, scoring)
+        filtered_out = FilteredOutView(catalog, cutoff, _crowd_threshold(decisions))
+        if emit:
+            _emit_crowd_filter(emit, catalog.names, (m["crowdiness"] for m in catalog.metadata), _crowd_threshold(decisions))
+        if instrumentation.enabled:
+            instrumentation.count("activities.passed", cutoff)
+            instrumentation.count("activities.filtered", len(catalog) - cutoff)
         
-        if verbose:
-            print(f"\n🏆 #{i+1}: {activity} (score={score:.2f})")
-            print(f"   📝 {summary}")
-            print(f"   💬 {explanation}")
+        recommendations = _build_recommendations(scored_activities, decisions, filtered_out, tone, verbose)
+        if emit:
+            emit("pipeline_end")
+        return recommendations
+
+def verify_indexed_parity(tone: ToneStyle = ToneStyle.NEUTRAL, seeds: Iterable[int] = PARITY_SEEDS) -> bool:
+    """Check that the indexed pipeline reproduces the row-wise one exactly.
+
+    Small blocks make the demo catalog span several of them and let the
+    synthetic ones exercise block pruning.
+    """
+    return _matches_reference(
+        lambda activities: ActivityCatalog(activities, block_size=2 if len(activities) < 16 else 16),
+        lambda catalog, evidence, k, scoring: recommend_activities_indexed(
+            tone, catalog, k, evidence=evidence, scoring=scoring
+        ),
+        tone, seeds
+    )
+
+# --- 10. Batch Decisions over Columnar Evidence ---
+class EvidenceColumns:
+    """Evidence for many (user, proposition) segments in contiguous arrays.
+
+    Segment ``i`` spans ``codes[offsets[i]:offsets[i + 1]]`` and the matching
+    slice of ``weights``; beliefs are stored as ``BELIEF_CODES`` values.
+    """
+
+    def __init__(self, codes, weights, offsets):
+        self.codes = codes
+        self.weights = weights
+        self.offsets = offsets
+
+    @classmethod
+    def from_segments(cls, segments: List[List[Evidence]]) -> "EvidenceColumns":
+        if np is None:
+            raise ImportError("numpy is required for batch decisions")
+        lengths = np.fromiter((len(evs) for evs in segments), dtype=np.int64, count=len(segments))
+        offsets = np.zeros(len(segments) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        flat = [e for evs in segments for e in evs]
+        codes = np.fromiter((BELIEF_CODES[e.belief] for e in flat), dtype=np.uint8, count=len(flat))
+        weights = np.fromiter((e.weight for e in flat), dtype=np.float64, count=len(flat))
+        return cls(codes, weights, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def totals(self):
+        """Per-segment (T, F, B) weight totals as an ``(n, 3)`` array."""
+        n = len(self)
+        segment_ids = np.repeat(np.arange(n), np.diff(self.offsets))
+        sums = np.bincount(segment_ids * 4 + self.codes, weights=self.weights, minlength=n * 4)
+        return sums.reshape(n, 4)[:, :3]
+
+def decide_columns(props: List[str], columns: EvidenceColumns) -> List[Decision]:
+    """Decide every segment of ``columns`` with segmented reductions.
+
+    ``props[i]`` names segment ``i``; results match ``decide`` for the same
+    evidence lists, up to the last bit of the vectorized sigmoid.
+    """
+    totals = columns.totals()
+    t, f, b = totals[:, 0], totals[:, 1], totals[:, 2]
+    total = t + f + b
     
-    if verbose:
-        print("=" * 60)
+    truth = np.full(len(props), BELIEF_CODES[Belnap.N], dtype=np.uint8)
+    truth[f > t] = BELIEF_CODES[Belnap.F]
+    truth[t > f] = BELIEF_CODES[Belnap.T]
+    truth[(t > 0) & (f > 0)] = BELIEF_CODES[Belnap.B]
     
-    return recommendations
+    with np.errstate(divide="ignore", invalid="ignore"):
+        confidence = 1 / (1 + np.exp(-4 * (np.abs(t - f) / total - 0.1)))
+    confidence = np.where(total > 0, confidence, 0.0)
+    
+    empty = np.diff(columns.offsets) == 0
+    decisions = []
+    for prop, code, conf, t_weight, f_weight, tot, is_empty in zip(
+        props, truth.tolist(), confidence.tolist(), t.tolist(), f.tolist(), total.tolist(), empty.tolist()
+    ):
+        if is_empty:
+            decisions.append(Decision(prop, Belnap.N, 0.0, f"No evidence found for {prop}"))
+        elif tot == 0:
+            decisions.append(Decision(prop, Belnap.N, 0.0, "All evidence has zero weight"))
+        else:
+            verdict = BELIEFS_BY_CODE[code]
+            decisions.append(Decision(prop, verdict, conf, _verdict_reasoning(verdict, t_weight, f_weight)))
+    return decisions
 
-# --- 6. Demo and Testing ---
-if __name__ == "__main__":
+def decide_batch(
+    pairs: List[Tuple[str, str]],
+    user_evidence: Dict[str, Dict[str, List[Evidence]]]
+) -> List[Decision]:
+    """Decide many (user, proposition) pairs in one vectorized pass.
+
+    ``user_evidence`` maps each user to an ``evidence_db``-shaped dict.
+    Decisions are returned in the order of ``pairs``.
+    """
+    segments = [user_evidence.get(user, {}).get(prop, []) for user, prop in pairs]
+    columns = EvidenceColumns.from_segments(segments)
+    return decide_columns([prop for _, prop in pairs], columns)
+
+# --- 11. Asynchronous Evidence Providers ---
+class AsyncEvidenceProvider:
+    """An evidence source that is queried asynchronously.
+
+    Subclasses implement ``fetch``; ``timeout`` bounds how long a decision
+    waits for this source before treating it as unavailable.
+    """
+
+    def __init__(self, source: str, timeout: float = 1.0):
+        self.source = source
+        self.timeout = timeout
+
+    async def fetch(self, prop: str) -> List[Evidence]:
+        raise NotImplementedError
+
+class StaticEvidenceProvider(AsyncEvidenceProvider):
+    """Serves one source's rows from an ``evidence_db``-shaped dict.
+
+    ``latency`` simulates the round trip of the real device or service.
+    """
+
+    def __init__(self, source: str, evidence: Dict[str, List[Evidence]] = None,
+                 timeout: float = 1.0, latency: float = 0.0):
+        super().__init__(source, timeout)
+        self.evidence = evidence_db if evidence is None else evidence
+        self.latency = latency
+
+    async def fetch(self, prop: str) -> List[Evidence]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [e for e in self.evidence.get(prop, []) if e.source == self.source]
+
+def providers_from_evidence(
+    evidence: Dict[str, List[Evidence]] = None,
+    timeout: float = 1.0
+) -> List[StaticEvidenceProvider]:
+    """One ``StaticEvidenceProvider`` per source named in ``evidence``."""
+    evidence = evidence_db if evidence is None else evidence
+    sources = dict.fromkeys(e.source for evs in evidence.values() for e in evs)
+    return [StaticEvidenceProvider(source, evidence, timeout) for source in sources]
+
+async def _fetch_or_neither(provider: AsyncEvidenceProvider, prop: str) -> List[Evidence]:
+    """Query one provider; a timeout or failure contributes Belnap N.
+
+    Failures other than a timeout are logged with their traceback. Both
+    kinds are counted (``providers.timeout``/``providers.error``) and
+    emitted as ``provider_unavailable`` events.
+    """
+    try:
+        return await asyncio.wait_for(provider.fetch(prop), provider.timeout)
+    except asyncio.TimeoutError:
+        outcome = "timeout"
+    except Exception:
+        outcome = "error"
+        logger.warning("Evidence provider %r failed for %s", provider.source, prop, exc_info=True)
+    if instrumentation.enabled:
+        instrumentation.count(f"providers.{outcome}")
+    emit = instrumentation.emitter()
+    if emit:
+        emit("provider_unavailable", source=provider.source, prop=prop, outcome=outcome)
+    return [Evidence(provider.source, Belnap.N, 0.0)]
+
+async def decide_async(prop: str, providers: List[AsyncEvidenceProvider]) -> Decision:
+    """``decide`` over evidence fetched from all providers concurrently.
+
+    The wait is bounded by the slowest provider's timeout rather than the
+    sum of their latencies.
+    """
+    results = await asyncio.gather(*(_fetch_or_neither(p, prop) for p in providers))
+    evs = [e for batch in results for e in batch]
+    return decide(prop, evidence={prop: evs})
+
+async def recommend_activities_async(
+    providers: List[AsyncEvidenceProvider],
+    tone: ToneStyle = ToneStyle.NEUTRAL,
+    top_k: int = 3,
+    activities: Iterable[Tuple[str, Dict[str, Any]]] = None,
+    scoring: ScoringPolicy = None
+) -> List[RecommendationWithExplanation]:
+    """Asynchronous counterpart of ``recommend_activities_with_explanations``.
+
+    All four propositions are decided at once, each fanning out to every
+    provider; the rest of the pipeline is shared with the synchronous path.
+    """
+    keys = list(DECISION_PROPS)
+    with instrumentation.span("recommend_async", tone=tone.value, top_k=top_k):
+        with instrumentation.span("decide", providers=len(providers)):
+            results = await asyncio.gather(*(decide_async(DECISION_PROPS[key], providers) for key in keys))
+        return _recommend_from_decisions(dict(zip(keys, results)), tone, False, top_k, activities, scoring)
+
+# --- 12. Sharded Batch Runner ---
+_SHARD_WORKER: Dict[str, Any] = {}
+
+def _init_shard_worker(catalog_dir: str, tone: ToneStyle, top_k: int, scoring: ScoringPolicy) -> None:
+    """Load the shared catalog once per worker process."""
+    if np is not None:
+        _SHARD_WORKER["columns"] = ActivityColumns.load(catalog_dir)
+    else:
+        with open(os.path.join(catalog_dir, "activities.json"), encoding="utf-8") as f:
+            _SHARD_WORKER["activities"] = json.load(f)
+    _SHARD_WORKER["tone"] = tone
+    _SHARD_WORKER["top_k"] = top_k
+    _SHARD_WORKER["scoring"] = scoring
+
+def _shard_decisions(users: List[Tuple[Any, Dict[str, List[Evidence]]]]) -> List[Dict[str, Decision]]:
+    keys = list(DECISION_PROPS)
+    if np is None:
+        return [
+            {key: decide(DECISION_PROPS[key], evidence=evidence) for key in keys}
+            for _, evidence in users
+        ]
+    user_evidence = {i: evidence for i, (_, evidence) in enumerate(users)}
+    pairs = [(i, DECISION_PROPS[key]) for i in range(len(users)) for key in keys]
+    flat = decide_batch(pairs, user_evidence)
+    return [dict(zip(keys, flat[i * len(keys):(i + 1) * len(keys)])) for i in range(len(users))]
+
+def _recommendation_record(user: Any, rec: RecommendationWithExplanation) -> Dict[str, Any]:
+    return {
+        "user": user,
+        "rank": rec.rank,
+        "activity": rec.activity,
+        "score": rec.score,
+        "summary": rec.summary,
+        "explanation": rec.explanation
+    }
+
+def _run_shard(shard_id: int, users: List[Tuple[Any, Dict[str, List[Evidence]]]], path: str) -> Tuple[int, int]:
+    """Recommend for one shard of users and publish its JSONL file atomically."""
+    tone, top_k, scoring = _SHARD_WORKER["tone"], _SHARD_WORKER["top_k"], _SHARD_WORKER["scoring"]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as out:
+        for (user, _), decisions in zip(users, _shard_decisions(users)):
+            if "columns" in _SHARD_WORKER:
+                recs = _recommend_columnar_from_decisions(decisions, _SHARD_WORKER["columns"], tone, top_k, False, scoring)
+            else:
+                recs = _recommend_from_decisions(decisions, tone, False, top_k, _SHARD_WORKER["activities"].items(), scoring)
+            for rec in recs:
+                out.write(json.dumps(_recommendation_record(user, rec)) + "\n")
+    os.replace(tmp_path, path)
+    return shard_id, len(users)
+
+def _digest(parts: Iterable[Any]) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(repr(part).encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+def _shard_manifest(
+    users: List[Tuple[Any, Dict[str, List[Evidence]]]],
+    activities: Dict[str, Dict[str, Any]],
+    tone: ToneStyle,
+    top_k: int,
+    shard_size: int,
+    scoring: ScoringPolicy
+) -> Dict[str, Any]:
+    """Everything a shard's contents depend on, with the inputs reduced to hashes."""
+    scoring = scoring or DEFAULT_SCORING_POLICY
+    return {
+        "version": 1,
+        "tone": tone.value,
+        "top_k": top_k,
+        "shard_size": shard_size,
+        "users": _digest(
+            (user, [(prop, [tuple(e) for e in evs]) for prop, evs in evidence.items()])
+            for user, evidence in users
+        ),
+        "catalog": hashlib.sha256(json.dumps(activities, sort_keys=True).encode("utf-8")).hexdigest(),
+        "scoring": _digest((scoring.base, *scoring.rules))
+    }
+
+def _check_shard_manifest(output_dir: str, manifest: Dict[str, Any]) -> None:
+    """Record ``manifest`` for a fresh run, or refuse to resume a different one."""
+    path = os.path.join(output_dir, "manifest.json")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            previous = json.load(f)
+        changed = sorted(key for key in manifest.keys() | previous.keys() if manifest.get(key) != previous.get(key))
+        if changed:
+            raise ValueError(
+                f"{output_dir} holds shards from a run with different {', '.join(changed)}; "
+                "use a new output_dir or remove the old one"
+            )
+        return
+    if any(name.startswith("shard-") for name in os.listdir(output_dir)):
+        raise ValueError(f"{output_dir} holds shards without a manifest; use a new output_dir or remove the old one")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def run_sharded_recommendations(
+    user_evidence: Dict[Any, Dict[str, List[Evidence]]],
+    output_dir: str,
+    activities: Dict[str, Dict[str, Any]] = None,
+    tone: ToneStyle = ToneStyle.NEUTRAL,
+    top_k: int = 3,
+    shard_size: int = 1000,
+    workers: int = None,
+    progress: Callable[[int, int, int], None] = None,
+    scoring: ScoringPolicy = None
+) -> List[str]:
+    """Recommend for a large user cohort across a process pool.
+
+    Users are split, in ``user_evidence`` order, into shards of
+    ``shard_size``; each shard is written to ``output_dir/shard-NNNNN.jsonl``
+    (one JSON record per recommendation) and only appears once complete.
+    Re-running with the same inputs resumes: shards whose file already
+    exists are skipped. ``output_dir/manifest.json`` records the run's
+    tone, ``top_k``, ``shard_size`` and hashes of the users' evidence, the
+    catalog and the scoring policy; resuming with any of them changed
+    raises ``ValueError`` instead of mixing old and new shards. The
+    catalog is written once to ``output_dir/catalog`` and memory-mapped by
+    every worker when numpy is available. ``progress(done, total,
+    shard_id)`` is called as shards finish. Returns the shard paths in
+    order.
+    """
+    activities = activities_db if activities is None else activities
+    users = list(user_evidence.items())
+    os.makedirs(output_dir, exist_ok=True)
+    _check_shard_manifest(output_dir, _shard_manifest(users, activities, tone, top_k, shard_size, scoring))
+    
+    catalog_dir = os.path.join(output_dir, "catalog")
+    os.makedirs(catalog_dir, exist_ok=True)
+    if np is not None:
+        attributes = (*ACTIVITY_ATTRIBUTES, *(scoring or DEFAULT_SCORING_POLICY).attributes)
+        ActivityColumns.from_dict(activities, attributes).save(catalog_dir)
+    else:
+        with open(os.path.join(catalog_dir, "activities.json"), "w", encoding="utf-8") as f:
+            json.dump(activities, f)
+    
+    shards = [users[start:start + shard_size] for start in range(0, len(users), shard_size)]
+    paths = [os.path.join(output_dir, f"shard-{i:05d}.jsonl") for i in range(len(shards))]
+    pending = [i for i, path in enumerate(paths) if not os.path.exists(path)]
+    done = len(shards) - len(pending)
+    
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_shard_worker,
+        initargs=(catalog_dir, tone, top_k, scoring)
+    ) as pool:
+        futures = [pool.submit(_run_shard, i, shards[i], paths[i]) for i in pending]
+        for future in as_completed(futures):
+            shard_id, _ = future.result()
+            done += 1
+            if progress is not None:
+                progress(done, len(shards), shard_id)
+    
+    return paths
+
+def verify_sharded_run(workers: int = 2) -> bool:
+    """Check a sharded run over ``VersionedEvidenceDB`` users against the in-process pipeline.
+
+    Shards decide with the vectorized sigmoid, so scores are compared with
+    a tolerance; activities and ranks must match exactly.
+    """
+    users = {f"user{i}": VersionedEvidenceDB(synthetic_evidence_db(3, i)) for i in range(5)}
+    expected = [
+        (user, rec.rank, rec.activity, rec.score)
+        for user, evidence in users.items()
+        for rec in recommend_activities_with_explanations(verbose=False, evidence=evidence)
+    ]
+    with tempfile.TemporaryDirectory() as output_dir:
+        records = []
+        for path in run_sharded_recommendations(users, output_dir, shard_size=2, workers=workers):
+            with open(path, encoding="utf-8") as f:
+                records.extend(json.loads(line) for line in f)
+    actual = [(r["user"], r["rank"], r["activity"], r["score"]) for r in records]
+    return len(actual) == len(expected) and all(
+        a[:3] == e[:3] and math.isclose(a[3], e[3], rel_tol=1e-9) for a, e in zip(actual, expected)
+    )
+
+# --- 13. Compact Evidence Storage ---
+class EvidenceView:
+    """Read-only ``Evidence``-like view of one row in an ``EvidenceRows`` block."""
+    __slots__ = ("_rows", "_index")
+    _fields = Evidence._fields
+
+    def __init__(self, rows: "EvidenceRows", index: int):
+        self._rows = rows
+        self._index = index
+
+    @property
+    def source(self) -> str:
+        return self._rows.source_names[self._rows.sources[self._index]]
+
+    @property
+    def belief(self) -> Belnap:
+        return BELIEFS_BY_CODE[self._rows.codes[self._index]]
+
+    @property
+    def weight(self) -> float:
+        return self._rows.weights[self._index]
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter((self.source, self.belief, self.weight))
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, (EvidenceView, tuple)):
+            return NotImplemented
+        return tuple(self) == tuple(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"EvidenceView(source={self.source!r}, belief={self.belief}, weight={self.weight!r})"
+
+class EvidenceRows(Sequence):
+    """Packed evidence for one proposition.
+
+    Beliefs are ``BELIEF_CODES`` bytes, weights float32 and sources indexes
+    into the owning store's interned name table. Running T/F/B totals are
+    kept as rows are appended, so aggregation never rescans the rows.
+    """
+    __slots__ = ("codes", "weights", "sources", "source_names", "totals")
+
+    def __init__(self, source_names: List[str]):
+        self.codes = array("B")
+        self.weights = array("f")
+        self.sources = array("I")
+        self.source_names = source_names
+        self.totals = [0.0, 0.0, 0.0, 0.0]
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [EvidenceView(self, i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("evidence index out of range")
+        return EvidenceView(self, index)
+
+    def _thaw(self) -> None:
+        """Copy snapshot-mapped (read-only) columns into growable arrays."""
+        if not isinstance(self.codes, array):
+            self.codes = array("B", self.codes.tobytes())
+            weights = array("f")
+            weights.frombytes(self.weights.tobytes())
+            sources = array("I")
+            sources.frombytes(self.sources.tobytes())
+            self.weights, self.sources = weights, sources
+
+class CompactEvidenceStore(Mapping):
+    """Memory-compact, ``evidence_db``-compatible evidence database.
+
+    Maps each proposition to an ``EvidenceRows`` block of packed rows with
+    interned source names, so it can be passed anywhere an
+    ``evidence_db``-shaped dict is accepted (e.g. ``decide(evidence=...)``).
+    ``decide()`` on the store itself reads the running totals directly.
+    Weights are stored as float32, so confidences can differ from the
+    float64 ``Evidence`` path in the last few digits.
+    """
+
+    def __init__(self, evidence: Dict[str, List[Evidence]] = None):
+        self._rows: Dict[str, EvidenceRows] = {}
+        self._source_names: List[str] = []
+        self._source_ids: Dict[str, int] = {}
+        for prop, evs in (evidence or {}).items():
+            self.extend(prop, evs)
+
+    def _intern(self, source: str) -> int:
+        source_id = self._source_ids.get(source)
+        if source_id is None:
+            source_id = len(self._source_names)
+            self._source_names.append(sys.intern(source))
+            self._source_ids[source] = source_id
+        return source_id
+
+    def append(self, prop: str, evidence: Evidence) -> None:
+        self.extend(prop, (evidence,))
+
+    def extend(self, prop: str, evidence: Iterable[Evidence]) -> None:
+        rows = self._rows.get(prop)
+        if rows is None:
+            rows = self._rows[sys.intern(prop)] = EvidenceRows(self._source_names)
+        rows._thaw()
+        totals, weights = rows.totals, rows.weights
+        for e in evidence:
+            code = BELIEF_CODES[e.belief]
+            rows.codes.append(code)
+            weights.append(e.weight)
+            rows.sources.append(self._intern(e.source))
+            totals[code] += weights[-1]  # accumulate the stored float32 value
+
+    def __getitem__(self, prop: str) -> EvidenceRows:
+        return self._rows[prop]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def totals(self, prop: str) -> Tuple[float, float, float]:
+        """Running (T, F, B) weight totals for ``prop``."""
+        rows = self._rows.get(prop)
+        if rows is None:
+            return 0.0, 0.0, 0.0
+        return rows.totals[0], rows.totals[1], rows.totals[2]
+
+    def decide(self, prop: str) -> Decision:
+        """Same result as ``decide(prop, evidence=self)``, in O(1)."""
+        rows = self._rows.get(prop)
+        if not rows:
+            return Decision(prop, Belnap.N, 0.0, f"No evidence found for {prop}")
+        return _decision_from_totals(prop, *self.totals(prop))
+
+    def nbytes(self) -> int:
+        """Approximate bytes held by the packed row arrays."""
+        return sum(
+            rows.codes.itemsize * len(rows.codes)
+            + rows.weights.itemsize * len(rows.weights)
+            + rows.sources.itemsize * len(rows.sources)
+            for rows in self._rows.values()
+        )
+
+    def save_snapshot(self, path: str) -> None:
+        """Write the store in the binary snapshot format read by ``load_snapshot``.
+
+        Layout: ``SNAPSHOT_MAGIC``, a little-endian u32 header length, a
+        JSON header (propositions with row counts and totals, source names,
+        byte order), then every proposition's belief codes, float32 weights
+        and uint32 source ids as three contiguous, 4-byte aligned sections.
+        The file is written beside ``path`` and renamed over it, so saving
+        a store back to the snapshot it was mapped from is safe.
+        """
+        props = list(self._rows)
+        header = json.dumps({
+            "version": 1,
+            "byteorder": sys.byteorder,
+            "sources": self._source_names,
+            "props": [[prop, len(self._rows[prop]), self._rows[prop].totals] for prop in props]
+        }).encode("utf-8")
+        preamble = len(SNAPSHOT_MAGIC) + 4 + len(header)
+        n_rows = sum(len(self._rows[prop]) for prop in props)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            f.write(bytes(-preamble % 4))
+            for prop in props:
+                f.write(self._rows[prop].codes)
+            f.write(bytes(-n_rows % 4))
+            for column in ("weights", "sources"):
+                for prop in props:
+                    f.write(getattr(self._rows[prop], column))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load_snapshot(cls, path: str, mmap: bool = True) -> "CompactEvidenceStore":
+        """Open a ``save_snapshot`` file.
+
+        With ``mmap`` the row columns are zero-copy ``memoryview`` casts
+        over a read-only mapping, so opening costs only the header parse;
+        the first ``extend`` on a proposition copies its rows into memory.
+        """
+        with open(path, "rb") as f:
+            buffer = _map_file(f) if mmap else f.read()
+        view = memoryview(buffer)
+        if bytes(view[:len(SNAPSHOT_MAGIC)]) != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not an evidence snapshot")
+        offset = len(SNAPSHOT_MAGIC) + 4
+        header_len, = struct.unpack_from("<I", view, len(SNAPSHOT_MAGIC))
+        header = json.loads(bytes(view[offset:offset + header_len]))
+        if header["version"] != 1 or header["byteorder"] != sys.byteorder:
+            raise ValueError(f"unsupported snapshot {path} (version {header['version']}, {header['byteorder']}-endian)")
+        offset += header_len
+        offset += -offset % 4
+        
+        store = cls()
+        store._source_names.extend(sys.intern(name) for name in header["sources"])
+        store._source_ids.update((name, i) for i, name in enumerate(store._source_names))
+        n_rows = sum(count for _, count, _ in header["props"])
+        codes_at = offset
+        weights_at = codes_at + n_rows + (-n_rows % 4)
+        sources_at = weights_at + 4 * n_rows
+        start = 0
+        for prop, count, totals in header["props"]:
+            rows = store._rows[sys.intern(prop)] = EvidenceRows(store._source_names)
+            rows.codes = view[codes_at + start:codes_at + start + count]
+            rows.weights = view[weights_at + 4 * start:weights_at + 4 * (start + count)].cast("f")
+            rows.sources = view[sources_at + 4 * start:sources_at + 4 * (start + count)].cast("I")
+            rows.totals = totals
+            start += count
+        return store
+
+SNAPSHOT_MAGIC = b"RSEVID\x00\x01"
+
+def _map_file(f) -> mmap.mmap:
+    if os.fstat(f.fileno()).st_size == 0:
+        return b""
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def verify_snapshot_roundtrip(rows_per_prop: int = 5000, seed: int = 0) -> bool:
+    """Check that a mapped snapshot can be saved back to its own path and reloaded intact."""
+    evidence = synthetic_evidence_db(rows_per_prop, seed)
+    expected = CompactEvidenceStore(evidence)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "evidence.snap")
+        expected.save_snapshot(path)
+        loaded = CompactEvidenceStore.load_snapshot(path)
+        loaded.save_snapshot(path)
+        reloaded = CompactEvidenceStore.load_snapshot(path)
+        return all(
+            [tuple(e) for e in store[prop]] == [tuple(e) for e in expected[prop]]
+            and store.totals(prop) == expected.totals(prop)
+            for store in (loaded, reloaded)
+            for prop in evidence
+        )
+
+# --- 14. Streaming Evidence Ingestion ---
+_BELIEFS_BY_NAME = {key.lower(): belief for belief in Belnap for key in (belief.name, belief.value)}
+
+def _parse_belief(value: str) -> Belnap:
+    belief = _BELIEFS_BY_NAME.get(str(value).strip().lower())
+    if belief is None:
+        raise ValueError(f"unknown belief {value!r}; expected one of T/F/B/N or True/False/Both/Neither")
+    return belief
+
+def _evidence_format(path: str, format: str = None) -> str:
+    if format is None:
+        format = "csv" if path.lower().endswith(".csv") else "jsonl"
+    if format not in ("jsonl", "csv"):
+        raise ValueError(f"unsupported evidence format {format!r}")
+    return format
+
+def iter_evidence_records(path: str, format: str = None) -> Iterator[Tuple[str, Evidence]]:
+    """Stream ``(proposition, Evidence)`` pairs from a JSONL or CSV file.
+
+    Each record has ``prop``, ``source``, ``belief`` (``T``/``F``/``B``/``N``
+    or the ``Belnap`` value) and ``weight``. ``format`` is inferred from the
+    extension (``.csv``, else JSONL). One line is held at a time.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if _evidence_format(path, format) == "csv":
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for line_no, record in enumerate(records, 1):
+            try:
+                yield record["prop"], Evidence(
+                    sys.intern(record["source"]), _parse_belief(record["belief"]), float(record["weight"])
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"{path}: bad evidence record {line_no}: {e}") from e
+
+def load_evidence(
+    path: str,
+    target: Any = None,
+    chunk_size: int = 10000,
+    format: str = None
+) -> Any:
+    """Stream an evidence file into ``target`` in chunks of ``chunk_size`` records.
+
+    ``target`` may be a ``CompactEvidenceStore`` (the default, created
+    fresh), a ``DecisionStore`` or an ``evidence_db``-style dict of lists.
+    Each chunk is grouped by proposition and bulk-inserted, so memory stays
+    bounded by the chunk regardless of file size. Returns ``target``.
+    """
+    if target is None:
+        target = CompactEvidenceStore()
+    records = iter_evidence_records(path, format)
+    
+    with instrumentation.span("load_evidence", path=path):
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                break
+            by_prop: Dict[str, List[Evidence]] = {}
+            for prop, evidence in chunk:
+                by_prop.setdefault(prop, []).append(evidence)
+            for prop, evs in by_prop.items():
+                if isinstance(target, (CompactEvidenceStore, DecisionStore)):
+                    target.extend(prop, evs)
+                elif prop in target:
+                    target[prop].extend(evs)
+                else:
+                    target[prop] = evs
+            if instrumentation.enabled:
+                instrumentation.count("evidence.loaded", len(chunk))
+    return target
+
+# --- 15. Benchmark Suite ---
+_BENCH_SOURCES = (
+    "HeartRateMonitor", "JournalEntry", "SleepPattern", "UserSurvey", "PastBookings",
+    "FriendComment", "LocationHistory", "SocialMedia", "ActivityHistory", "PhotoAnalysis"
+)
+
+def synthetic_evidence_db(evidence_per_prop: int, seed: int = 0) -> Dict[str, List[Evidence]]:
+    """Random ``evidence_db`` with ``evidence_per_prop`` rows for each decided proposition."""
+    rng = random.Random(seed)
+    beliefs = (Belnap.T, Belnap.T, Belnap.T, Belnap.F, Belnap.B, Belnap.N)
+    return {
+        prop: [
+            Evidence(rng.choice(_BENCH_SOURCES), rng.choice(beliefs), round(rng.random(), 2))
+            for _ in range(evidence_per_prop)
+        ]
+        for prop in DECISION_PROPS.values()
+    }
+
+def synthetic_activities_db(n_activities: int, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """Random ``activities_db`` with ``n_activities`` entries."""
+    rng = random.Random(seed)
+    return {
+        f"Activity{i:07d}": {attr: round(rng.random(), 2) for attr in ACTIVITY_ATTRIBUTES}
+        for i in range(n_activities)
+    }
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+def _measure(stage: str, fn: Callable[[], Any], repeat: int, **params: Any) -> Dict[str, Any]:
+    fn()  # warm-up
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    
+    # Peak memory is taken from a separate run; tracemalloc would skew the timings
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    return {
+        "stage": stage,
+        **params,
+        "repeat": repeat,
+        "ops_per_sec": repeat / sum(latencies),
+        "p50_ms": _percentile(latencies, 0.50) * 1e3,
+        "p99_ms": _percentile(latencies, 0.99) * 1e3,
+        "peak_kib": peak / 1024
+    }
+
+def run_benchmarks(
+    activity_scales: List[int] = (10, 1000, 100000),
+    evidence_scales: List[int] = (1, 100, 1000),
+    repeat: int = 20,
+    seed: int = 0
+) -> Dict[str, Any]:
+    """Time ``decide``, explanation rendering and the full pipeline.
+
+    ``decide`` runs once per evidence scale, the recommenders once per
+    activity scale (with the smallest evidence scale). Returns a
+    JSON-serializable report of throughput, p50/p99 latency and peak
+    traced memory per stage.
+    """
+    results = []
+    for n_evidence in evidence_scales:
+        evidence = synthetic_evidence_db(n_evidence, seed)
+        results.append(_measure(
+            "decide",
+            lambda: [decide(prop, evidence=evidence) for prop in DECISION_PROPS.values()],
+            repeat, evidence_per_prop=n_evidence
+        ))
+    
+    evidence = synthetic_evidence_db(min(evidence_scales), seed)
+    for n_activities in activity_scales:
+        activities = synthetic_activities_db(n_activities, seed)
+        results.append(_measure(
+            "recommend",
+            lambda: recommend_activities_with_explanations(
+                verbose=False, activities=activities.items(), evidence=evidence
+            ),
+            repeat, activities=n_activities, evidence_per_prop=min(evidence_scales)
+        ))
+        results.append(_measure(
+            "recommend_multi_tone",
+            lambda: [
+                (rec.explanations, rec.summaries)
+                for rec in recommend_activities_multi_tone(activities=activities.items(), evidence=evidence)
+            ],
+            repeat, activities=n_activities, evidence_per_prop=min(evidence_scales)
+        ))
+        if np is not None:
+            columns = ActivityColumns.from_dict(activities)
+            results.append(_measure(
+                "recommend_columnar",
+                lambda: recommend_activities_columnar(columns=columns, evidence=evidence),
+                repeat, activities=n_activities, evidence_per_prop=min(evidence_scales)
+            ))
+    
+    traces = [
+        rec.reasoning_trace
+        for rec in recommend_activities_with_explanations(verbose=False, top_k=3)
+    ]
+    for tone in ToneStyle:
+        generator = ExplanationGenerator(tone)
+        results.append(_measure(
+            "generate_explanation",
+            lambda: [generator.generate_explanation(trace) for trace in traces],
+            repeat, tone=tone.value
+        ))
+    
+    return {
+        "python": sys.version.split()[0],
+        "numpy": None if np is None else np.__version__,
+        "seed": seed,
+        "results": results
+    }
+
+def _bench_key(result: Dict[str, Any]) -> Tuple:
+    return tuple(sorted((k, v) for k, v in result.items() if k in ("stage", "activities", "evidence_per_prop", "tone")))
+
+def compare_benchmarks(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2) -> List[str]:
+    """Describe every stage whose p50 latency regressed by more than ``tolerance``."""
+    previous = {_bench_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get(_bench_key(result))
+        if before and result["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{dict(_bench_key(result))}: p50 {before['p50_ms']:.3f}ms -> {result['p50_ms']:.3f}ms"
+            )
+    return regressions
+
+# --- 16. Demo and Testing ---
+def run_demo():
     print("Testing all tone styles:\n")
     
     for tone in [ToneStyle.CASUAL, ToneStyle.EXPERT, ToneStyle.EMPATHETIC, ToneStyle.NEUTRAL]:
@@ -502,4 +2849,63 @@ if __name__ == "__main__":
             print(f"Explanation: {rec.explanation}")
             print(f"Score: {rec.score:.2f}\n")
         
-        print("\n")
\ No newline at end of file
+        if np is not None:
+            print(f"Columnar parity: {'OK' if verify_columnar_parity(tone) else 'MISMATCH'}")
+        print(f"Indexed parity: {'OK' if verify_indexed_parity(tone) else 'MISMATCH'}")
+        
+        print("\n")
+
+def run_checks() -> int:
+    """Run every ``verify_*`` self-check; returns the number that failed."""
+    checks = [
+        ("versioned pickling", verify_versioned_pickling),
+        ("indexed parity", verify_indexed_parity),
+        ("snapshot round trip", verify_snapshot_roundtrip),
+        ("sharded run", verify_sharded_run)
+    ]
+    if np is not None:
+        checks.insert(1, ("columnar parity", verify_columnar_parity))
+    failed = 0
+    for name, check in checks:
+        ok = check()
+        failed += not ok
+        print(f"{name:<22} {'OK' if ok else 'FAILED'}")
+    return failed
+
+def run_bench(args: argparse.Namespace) -> int:
+    report = run_benchmarks(args.activities, args.evidence, args.repeat, args.seed)
+    for r in report["results"]:
+        scale = ", ".join(f"{k}={r[k]}" for k in ("activities", "evidence_per_prop", "tone") if k in r)
+        print(f"{r['stage']:<22} {scale:<36} {r['ops_per_sec']:>10.1f} ops/s  "
+              f"p50={r['p50_ms']:.3f}ms  p99={r['p99_ms']:.3f}ms  peak={r['peak_kib']:.0f}KiB")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_benchmarks(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Explainable AI reasoning system (Vance)")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("demo", help="render every tone for the sample user (default)")
+    commands.add_parser("check", help="run the built-in parity and round-trip checks")
+    bench = commands.add_parser("bench", help="benchmark the reasoning pipeline")
+    bench.add_argument("--activities", type=int, nargs="+", default=[10, 1000, 100000])
+    bench.add_argument("--evidence", type=int, nargs="+", default=[1, 100, 1000])
+    bench.add_argument("--repeat", type=int, default=20)
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--out", help="write the JSON report here")
+    bench.add_argument("--baseline", help="JSON report to compare against; exit 1 on regression")
+    bench.add_argument("--tolerance", type=float, default=0.2, help="allowed p50 slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+    
+    if args.command == "bench":
+        sys.exit(run_bench(args))
+    if args.command == "check":
+        sys.exit(1 if run_checks() else 0)
+    run_demo()
@@ -14,107 +14,974 @@ Usage on Kaggle:
 2. Run this script with GPU acceleration
 3. Model will learn to generate equivalency pairs automatically
 
+Steps can also be run separately, each loading only what it needs:
+    python kaggle_equivalency_training.py prepare-data
+    python kaggle_equivalency_training.py tokenize
+    python kaggle_equivalency_training.py train [--batching packed]
+    python kaggle_equivalency_training.py generate ["prompt" ...]
+    python kaggle_equivalency_training.py evaluate
+
 Author: Michael Jagdeo
 Date: August 25, 2025
 """
 
+import argparse
 import json
-import torch
-import pandas as pd
-import numpy as np
-from datasets import Dataset
-from transformers import (
-    AutoTokenizer, 
-    AutoModelForCausalLM, 
-    TrainingArguments, 
-    Trainer,
-    DataCollatorForLanguageModeling,
-    pipeline
-)
-from trl import SFTTrainer
+import bisect
+import functools
 import gc
+import hashlib
 import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
+from types import SimpleNamespace
 import logging
 
+import numpy as np
+
+# torch, datasets, transformers, trl and peft are imported where they are
+# first needed, so data-only steps start without loading them.
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Chat markup for each message role; other roles are skipped
+ROLE_TAGS = {
+    "system": "<|system|>",
+    "user": "<|user|>",
+    "assistant": "<|assistant|>",
+}
+
+def format_conversation(messages):
+    """Render a list of chat messages into the training markup"""
+    return "".join(
+        f"{ROLE_TAGS[msg['role']]}{msg['content']}<|endoftext|>"
+        for msg in messages
+        if msg["role"] in ROLE_TAGS
+    )
+
+def _iter_json_array(f, key, chunk_size=1 << 16):
+    """
+    Incrementally yield the elements of the first array stored under ``key``
+    
+    Only the current element (plus one read chunk) is held in memory, so the
+    enclosing document can be arbitrarily large.
+    """
+    decoder = json.JSONDecoder()
+    marker = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    buffer = ""
+    
+    # Seek to the opening bracket, keeping enough tail to catch a split marker
+    while True:
+        match = marker.search(buffer)
+        if match:
+            buffer = buffer[match.end():]
+            break
+        chunk = f.read(chunk_size)
+        if not chunk:
+            raise ValueError(f"No '{key}' array found")
+        buffer = buffer[-(len(key) + 64):] + chunk
+    
+    pos = 0
+    while True:
+        # Skip separators between elements
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos == len(buffer):
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise ValueError(f"Unterminated '{key}' array")
+            buffer, pos = chunk, 0
+            continue
+        if buffer[pos] == "]":
+            return
+        try:
+            element, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Element spans past the buffer: read more (at least doubling it)
+            chunk = f.read(max(chunk_size, len(buffer)))
+            if not chunk:
+                raise
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield element
+        buffer, pos = buffer[end:], 0
+
+def iter_training_examples(path):
+    """
+    Stream training examples from a JSON or JSONL file
+    
+    ``.jsonl`` files hold one ``{"messages": [...]}`` example per line;
+    otherwise the file is the full equivalency dataset and
+    ``equivalency_training_dataset.training_examples`` is parsed incrementally.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from _iter_json_array(f, "training_examples")
+
+def is_held_out(example, fraction):
+    """
+    Deterministically assign ``fraction`` of examples to the held-out split
+    
+    The decision hashes the example's content, so it is stable across runs,
+    file orderings and corpus growth.
+    """
+    if fraction <= 0:
+        return False
+    digest = hashlib.sha256(json.dumps(example, sort_keys=True).encode()).digest()
+    return int.from_bytes(digest[:8], "big") < fraction * 2 ** 64
+
+def _formatted_examples(path, fingerprint=None, held_out_fraction=0.0):
+    """Dataset generator; ``fingerprint`` only keys the Arrow cache"""
+    for example in iter_training_examples(path):
+        if not is_held_out(example, held_out_fraction):
+            yield {"text": format_conversation(example["messages"])}
+
+def token_cache_key(dataset, tokenizer, max_length):
+    """
+    Content hash identifying a tokenization run
+    
+    Covers every text in the dataset, the tokenizer's full definition
+    (vocabulary, merges, normalizer and special tokens) and ``max_length``,
+    so any change to one of them yields a new cache directory.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{type(tokenizer).__name__}|{max_length}|".encode())
+    if getattr(tokenizer, "is_fast", False):
+        digest.update(tokenizer.backend_tokenizer.to_str().encode())
+    else:
+        digest.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode())
+    digest.update(json.dumps(tokenizer.special_tokens_map, sort_keys=True).encode())
+    for batch in dataset.iter(batch_size=1000):
+        for text in batch["text"]:
+            digest.update(text.encode())
+            digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+def _tokenize_shard(tokenizer, dataset, shard_path, max_length, dtype):
+    """Tokenize one dataset shard into flat token IDs plus row offsets (worker)"""
+    offsets = [0]
+    chunks = []
+    for batch in dataset.iter(batch_size=256):
+        for ids in tokenizer(batch["text"], truncation=True, max_length=max_length)["input_ids"]:
+            chunks.append(np.asarray(ids, dtype=dtype))
+            offsets.append(offsets[-1] + len(ids))
+    tokens = np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype)
+    
+    # Write under temporary names so a killed worker never leaves a valid shard
+    for suffix, array in (("tokens", tokens), ("offsets", np.asarray(offsets, dtype=np.int64))):
+        tmp_path = f"{shard_path}.{suffix}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, f"{shard_path}.{suffix}.npy")
+    return len(offsets) - 1
+
+class TokenizedShards:
+    """
+    Memory-mapped token shards written by ``UMPFEquivalencyTrainer.pretokenize``
+    
+    Each item is ``{"input_ids": [...]}``, ready for
+    ``DataCollatorForLanguageModeling``.
+    """
+    
+    def __init__(self, cache_dir):
+        with open(os.path.join(cache_dir, "manifest.json"), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self.cache_dir = cache_dir
+        self.tokens = []
+        self.offsets = []
+        for name in self.manifest["shards"]:
+            shard_path = os.path.join(cache_dir, name)
+            self.tokens.append(np.load(f"{shard_path}.tokens.npy", mmap_mode="r"))
+            self.offsets.append(np.load(f"{shard_path}.offsets.npy", mmap_mode="r"))
+        self._starts = np.cumsum([0] + [len(o) - 1 for o in self.offsets])
+    
+    def __len__(self):
+        return int(self._starts[-1])
+    
+    def lengths(self):
+        """Token count of every example, in dataset order"""
+        return np.concatenate([np.diff(o) for o in self.offsets]) if self.offsets else np.zeros(0, dtype=np.int64)
+    
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("token shard index out of range")
+        shard = int(np.searchsorted(self._starts, index, side="right")) - 1
+        row = index - self._starts[shard]
+        start, end = self.offsets[shard][row], self.offsets[shard][row + 1]
+        return {"input_ids": self.tokens[shard][start:end].astype(np.int64).tolist()}
+
+def pack_by_length(lengths, max_length):
+    """
+    Group example indices into bins of at most ``max_length`` tokens
+    
+    Best-fit decreasing: longest examples first, each into the fullest bin
+    that still has room, which keeps the number of bins (and so padding)
+    close to the minimum.
+    """
+    bins = []
+    free = []  # sorted (remaining capacity, bin index)
+    for index in sorted(range(len(lengths)), key=lambda i: -int(lengths[i])):
+        length = min(int(lengths[index]), max_length)
+        slot = bisect.bisect_left(free, (length, -1))
+        if slot < len(free):
+            remaining, b = free.pop(slot)
+        else:
+            remaining, b = max_length, len(bins)
+            bins.append([])
+        bins[b].append(index)
+        if remaining - length > 0:
+            bisect.insort(free, (remaining - length, b))
+    return bins
+
+class PackedShards:
+    """
+    ``TokenizedShards`` examples concatenated into sequences of up to ``max_length``
+    
+    Each item keeps its ``segment_lengths`` so ``PackedCollator`` can stop
+    attention and position IDs at example boundaries.
+    """
+    
+    def __init__(self, shards, max_length):
+        self.shards = shards
+        self.bins = pack_by_length(shards.lengths(), max_length)
+    
+    def __len__(self):
+        return len(self.bins)
+    
+    def __getitem__(self, index):
+        segments = [self.shards[i]["input_ids"] for i in self.bins[index]]
+        return {
+            "input_ids": [token for segment in segments for token in segment],
+            "segment_lengths": [len(segment) for segment in segments],
+        }
+
+class PackedCollator:
+    """
+    Pad packed sequences and describe their example boundaries
+    
+    Position IDs restart at every example, the first token of each example
+    is not a prediction target, and ``segment_ids`` (-1 on padding) feed
+    the block-diagonal attention installed by ``enable_packed_attention``.
+    """
+    
+    def __init__(self, pad_token_id):
+        self.pad_token_id = pad_token_id
+    
+    def __call__(self, features):
+        import torch
+        
+        width = max(len(f["input_ids"]) for f in features)
+        input_ids = torch.full((len(features), width), self.pad_token_id, dtype=torch.long)
+        labels = torch.full((len(features), width), -100, dtype=torch.long)
+        position_ids = torch.zeros((len(features), width), dtype=torch.long)
+        segment_ids = torch.full((len(features), width), -1, dtype=torch.long)
+        for row, feature in enumerate(features):
+            ids = torch.tensor(feature["input_ids"], dtype=torch.long)
+            input_ids[row, :len(ids)] = ids
+            labels[row, :len(ids)] = ids
+            start = 0
+            for segment, length in enumerate(feature["segment_lengths"]):
+                position_ids[row, start:start + length] = torch.arange(length)
+                segment_ids[row, start:start + length] = segment
+                labels[row, start] = -100
+                start += length
+        return {
+            "input_ids": input_ids,
+            "labels": labels,
+            "position_ids": position_ids,
+            "segment_ids": segment_ids,
+        }
+
+def enable_packed_attention(model):
+    """
+    Make a GPT-2 style model honour ``segment_ids`` from ``PackedCollator``
+    
+    A forward pre-hook on the model pops ``segment_ids`` and builds a
+    block-diagonal mask; pre-hooks on every transformer block pass it as
+    the additive attention mask (the blocks still apply their causal mask).
+    The hooks rely on the eager blocks' signature (the mask is their third
+    positional argument), so other attention implementations are refused.
+    Returns the hook handles; call ``remove()`` on each to undo.
+    """
+    import torch
+    
+    owner = next(
+        (m for m in model.modules() if hasattr(getattr(m, "transformer", None), "h")),
+        None
+    )
+    if owner is None:
+        raise ValueError("Packed attention needs a GPT-2 style model (transformer.h blocks)")
+    attn_implementation = getattr(owner.config, "_attn_implementation", "eager")
+    if attn_implementation != "eager":
+        raise ValueError(
+            f"Packed attention needs eager attention, but the model uses {attn_implementation!r}; "
+            "load it with attn_implementation=\"eager\""
+        )
+    
+    state = {}
+    
+    def capture_segments(module, args, kwargs):
+        segment_ids = kwargs.pop("segment_ids", None)
+        state.clear()
+        if segment_ids is not None:
+            same = segment_ids[:, :, None] == segment_ids[:, None, :]
+            state["allowed"] = (same & (segment_ids[:, None, :] >= 0))[:, None, :, :]
+        return args, kwargs
+    
+    def inject_mask(module, args, kwargs):
+        allowed = state.get("allowed")
+        if allowed is None:
+            return args, kwargs
+        dtype = args[0].dtype if args else kwargs["hidden_states"].dtype
+        mask = state.get(dtype)
+        if mask is None:
+            mask = state[dtype] = torch.zeros(allowed.shape, dtype=dtype, device=allowed.device).masked_fill(
+                ~allowed, torch.finfo(dtype).min
+            )
+        # Gradient checkpointing passes the block arguments positionally
+        if len(args) > 2:
+            args = args[:2] + (mask,) + args[3:]
+        else:
+            kwargs["attention_mask"] = mask
+        return args, kwargs
+    
+    handles = [owner.register_forward_pre_hook(capture_segments, with_kwargs=True)]
+    handles += [
+        block.register_forward_pre_hook(inject_mask, with_kwargs=True)
+        for block in owner.transformer.h
+    ]
+    return handles
+
+class TokenCountingCollator:
+    """Wrap a collator, counting real and padded tokens in every batch"""
+    
+    def __init__(self, collator):
+        self.collator = collator
+        self.real_tokens = 0
+        self.padded_tokens = 0
+    
+    def __call__(self, features):
+        batch = self.collator(features)
+        self.real_tokens += sum(len(f["input_ids"]) for f in features)
+        self.padded_tokens += batch["input_ids"].numel()
+        return batch
+
+CHECKPOINT_PATTERN = re.compile(r"^checkpoint-(\d+)$")
+CHECKPOINT_COMPLETE = ".complete"
+
+def valid_checkpoints(output_dir):
+    """Fully written checkpoint directories in ``output_dir``, oldest step first"""
+    if not os.path.isdir(output_dir):
+        return []
+    found = []
+    for name in os.listdir(output_dir):
+        match = CHECKPOINT_PATTERN.match(name)
+        path = os.path.join(output_dir, name)
+        if match and os.path.exists(os.path.join(path, CHECKPOINT_COMPLETE)):
+            found.append((int(match.group(1)), path))
+    return [path for _, path in sorted(found)]
+
+def latest_checkpoint(output_dir):
+    """Most recent fully written checkpoint in ``output_dir``, or None"""
+    checkpoints = valid_checkpoints(output_dir)
+    return checkpoints[-1] if checkpoints else None
+
+def _directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+def _to_cpu(obj, seen=None):
+    """Recursively copy tensors to CPU, keeping tensors that share storage shared"""
+    import torch
+    
+    if seen is None:
+        seen = {}
+    if torch.is_tensor(obj):
+        key = (obj.untyped_storage().data_ptr(), obj.storage_offset(), tuple(obj.shape), obj.dtype)
+        if key not in seen:
+            seen[key] = obj.detach().to("cpu", copy=True)
+        return seen[key]
+    if isinstance(obj, dict):
+        return {k: _to_cpu(v, seen) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(v, seen) for v in obj)
+    return obj
+
+class AsyncCheckpointMixin:
+    """
+    Trainer mixin writing checkpoints from a background thread
+    
+    At each save the model and optimizer state are copied to CPU on the
+    training thread (the only part that stalls it), then written to a
+    temporary directory by a writer thread. Small state - scheduler, RNG
+    and trainer state - is written synchronously. A ``.complete`` marker
+    and an atomic rename publish the checkpoint, so a session killed
+    mid-write never leaves a checkpoint that looks valid. Afterwards the
+    oldest checkpoints are deleted while the total exceeds
+    ``checkpoint_budget_gb`` (the newest is always kept).
+    """
+    
+    def __init__(self, *args, checkpoint_budget_gb=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkpoint_budget_gb = checkpoint_budget_gb
+        self._checkpoint_writer = ThreadPoolExecutor(max_workers=1)
+        self._pending_checkpoint = None
+        self._checkpoint_lock = threading.Lock()
+    
+    def wait_for_checkpoint(self):
+        """Block until the in-flight checkpoint (if any) is written; re-raises its error"""
+        if self._pending_checkpoint is not None:
+            pending, self._pending_checkpoint = self._pending_checkpoint, None
+            pending.result()
+    
+    def _save_checkpoint(self, model, trial, metrics=None):
+        # One write in flight at a time bounds the CPU memory used by snapshots
+        self.wait_for_checkpoint()
+        self.store_flos()
+        if not self.args.should_save:
+            return
+        
+        name = f"checkpoint-{self.state.global_step}"
+        final_dir = os.path.join(self.args.output_dir, name)
+        tmp_dir = os.path.join(self.args.output_dir, f"tmp-{name}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        
+        import torch
+        
+        if hasattr(self.model, "peft_config"):
+            # Adapter-only checkpoint: snapshot just the trainable weights
+            model_state = _to_cpu({n: p for n, p in self.model.named_parameters() if p.requires_grad})
+        else:
+            model_state = _to_cpu(self.model.state_dict())
+        optimizer_state = _to_cpu(self.optimizer.state_dict())
+        torch.save(self.lr_scheduler.state_dict(), os.path.join(tmp_dir, "scheduler.pt"))
+        self._save_rng_state(tmp_dir)
+        self.state.save_to_json(os.path.join(tmp_dir, "trainer_state.json"))
+        
+        self._pending_checkpoint = self._checkpoint_writer.submit(
+            self._write_checkpoint, model_state, optimizer_state, tmp_dir, final_dir
+        )
+    
+    def _write_checkpoint(self, model_state, optimizer_state, tmp_dir, final_dir):
+        """Writer thread: persist the snapshot, publish it, then collect garbage"""
+        import torch
+        
+        self.model.save_pretrained(tmp_dir, state_dict=model_state)
+        if self.tokenizer is not None:
+            self.tokenizer.save_pretrained(tmp_dir)
+        torch.save(optimizer_state, os.path.join(tmp_dir, "optimizer.pt"))
+        with open(os.path.join(tmp_dir, CHECKPOINT_COMPLETE), 'w') as f:
+            f.write(datetime.now().isoformat())
+        
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+        logger.info(f"Checkpoint written to {final_dir}")
+        self._collect_checkpoints()
+    
+    def _collect_checkpoints(self):
+        if self.checkpoint_budget_gb is None:
+            return
+        budget = self.checkpoint_budget_gb * 1024 ** 3
+        checkpoints = valid_checkpoints(self.args.output_dir)
+        sizes = [_directory_size(path) for path in checkpoints]
+        while len(checkpoints) > 1 and sum(sizes) > budget:
+            logger.info(f"Deleting {checkpoints[0]} to stay under {self.checkpoint_budget_gb}GB")
+            shutil.rmtree(checkpoints.pop(0), ignore_errors=True)
+            sizes.pop(0)
+    
+    def train(self, *args, **kwargs):
+        try:
+            return super().train(*args, **kwargs)
+        finally:
+            self.wait_for_checkpoint()
+
+@functools.lru_cache(maxsize=None)
+def training_classes():
+    """
+    Trainer and callback classes, defined on first use
+    
+    They subclass transformers/trl types, so defining them at import time
+    would load those libraries for every entry point.
+    """
+    from transformers import Trainer, TrainerCallback
+    from transformers.trainer_pt_utils import LengthGroupedSampler
+    from trl import SFTTrainer
+    
+    class ThroughputCallback(TrainerCallback):
+        """Log real (non-padding) tokens per second and the padding fraction"""
+        
+        def __init__(self, counter):
+            self.counter = counter
+            self.start = None
+        
+        def on_train_begin(self, args, state, control, **kwargs):
+            self.counter.real_tokens = self.counter.padded_tokens = 0
+            self.start = time.perf_counter()
+        
+        def stats(self):
+            elapsed = time.perf_counter() - self.start
+            padded = self.counter.padded_tokens or 1
+            return {
+                "tokens_per_sec": self.counter.real_tokens / elapsed,
+                "padding_fraction": 1 - self.counter.real_tokens / padded,
+            }
+        
+        def on_log(self, args, state, control, logs=None, **kwargs):
+            stats = self.stats()
+            logger.info(f"Step {state.global_step}: {stats['tokens_per_sec']:.0f} tokens/sec, "
+                        f"{stats['padding_fraction']:.1%} padding")
+    
+    class CheckpointingTrainer(AsyncCheckpointMixin, Trainer):
+        """Trainer with asynchronous, budgeted checkpoints"""
+    
+    class CheckpointingSFTTrainer(AsyncCheckpointMixin, SFTTrainer):
+        """SFTTrainer with asynchronous, budgeted checkpoints"""
+    
+    class LengthGroupedTrainer(CheckpointingTrainer):
+        """Trainer drawing batches of similar length from ``TokenizedShards``"""
+        
+        def _get_train_sampler(self):
+            return LengthGroupedSampler(
+                self.args.train_batch_size * self.args.gradient_accumulation_steps,
+                lengths=self.train_dataset.lengths().tolist(),
+            )
+    
+    return SimpleNamespace(
+        ThroughputCallback=ThroughputCallback,
+        CheckpointingTrainer=CheckpointingTrainer,
+        CheckpointingSFTTrainer=CheckpointingSFTTrainer,
+        LengthGroupedTrainer=LengthGroupedTrainer,
+    )
+
+class InferenceEngine:
+    """
+    Batched, KV-cached text generation from one loaded model
+    
+    The model and tokenizer are loaded once. Prompts are grouped by length
+    into left-padded batches and decoding stops per sequence at
+    ``<|endoftext|>``. Runs on GPU when available, otherwise on CPU.
+    """
+    
+    def __init__(self, model_path, device=None, batch_size=8):
+        """
+        Args:
+            model_path: Path or hub name of the model to load
+            device: "cuda" or "cpu" (defaults to cuda when available)
+            batch_size: Prompts decoded together
+        """
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.batch_size = batch_size
+        
+        logger.info(f"Loading inference model {model_path} on {self.device}")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, padding_side="left")
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(
+            model_path,
+            torch_dtype=torch.float16 if self.device == "cuda" else torch.float32
+        ).to(self.device).eval()
+    
+    def generate(self, prompts, max_new_tokens=512, temperature=0.7, do_sample=True):
+        """
+        Generate a completion for every prompt
+        
+        Args:
+            prompts: Fully formatted prompts (chat markup included)
+            max_new_tokens: Upper bound on generated tokens per prompt
+            temperature: Sampling temperature
+            do_sample: Sample (True) or decode greedily (False)
+            
+        Returns:
+            list: Completions (prompt excluded), in the order of ``prompts``
+        """
+        completions = [None] * len(prompts)
+        for batch, texts in self.generate_batches(prompts, max_new_tokens, temperature, do_sample):
+            for i, text in zip(batch, texts):
+                completions[i] = text
+        return completions
+    
+    def generate_batches(self, prompts, max_new_tokens=512, temperature=0.7, do_sample=True):
+        """
+        Yield ``(prompt indices, completions)`` as each batch finishes
+        
+        Same arguments as ``generate``; lets callers process results while
+        later batches are still decoding.
+        """
+        import torch
+        
+        # Similar lengths share a batch, so little compute goes to padding
+        order = sorted(range(len(prompts)), key=lambda i: len(prompts[i]))
+        
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            inputs = self.tokenizer(
+                [prompts[i] for i in batch],
+                return_tensors="pt",
+                padding=True
+            ).to(self.device)
+            
+            with torch.inference_mode():
+                output = self.model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    temperature=temperature,
+                    do_sample=do_sample,
+                    use_cache=True,
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    eos_token_id=self.tokenizer.eos_token_id,
+                )
+            
+            texts = self.tokenizer.batch_decode(
+                output[:, inputs["input_ids"].shape[1]:],
+                skip_special_tokens=True
+            )
+            yield batch, [text.strip() for text in texts]
+
+# Default keyword per quality metric, used for held-out cases
+QUALITY_PATTERNS = {
+    "monadic_structure_detection": "maybe",
+    "domain_identification": "selected domains",
+    "equivalence_justification": "isomorphism",
+    "mathematical_rigor": "functor",
+    "confidence_scoring": "confidence",
+}
+
+def held_out_test_cases(path, fraction, patterns=QUALITY_PATTERNS):
+    """
+    Build evaluation cases from the held-out split of a training file
+    
+    Each case replays the example's system and user messages and expects,
+    for every metric, that metric's keyword - but only where the reference
+    answer contains it too.
+    """
+    cases = []
+    for example in iter_training_examples(path):
+        if not is_held_out(example, fraction):
+            continue
+        messages = example["messages"]
+        reference = messages[-1]["content"].lower()
+        cases.append({
+            "id": hashlib.sha256(json.dumps(example, sort_keys=True).encode()).hexdigest()[:16],
+            "system": next((m["content"] for m in messages if m["role"] == "system"), ""),
+            "prompt": next((m["content"] for m in messages if m["role"] == "user"), ""),
+            "expected_patterns": {
+                metric: pattern for metric, pattern in patterns.items() if pattern.lower() in reference
+            },
+        })
+    return cases
+
+class PatternMatcher:
+    """
+    Aho-Corasick automaton for case-insensitive multi-keyword search
+    
+    ``find`` reports every pattern occurring in a text in a single pass,
+    however many patterns there are.
+    """
+    
+    def __init__(self, patterns):
+        self.patterns = sorted({p.lower() for p in patterns})
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [set()]
+        
+        for pattern in self.patterns:
+            node = 0
+            for char in pattern:
+                if char not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(set())
+                    self.goto[node][char] = len(self.goto) - 1
+                node = self.goto[node][char]
+            self.output[node].add(pattern)
+        
+        # Breadth-first failure links; outputs inherit along them
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                fail = self.fail[node]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[child] = self.goto[fail].get(char, 0)
+                self.output[child] |= self.output[self.fail[child]]
+    
+    def find(self, text):
+        """Set of patterns (lowercased) that occur in ``text``"""
+        found = set()
+        node = 0
+        for char in text.lower():
+            while node and char not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(char, 0)
+            if self.output[node]:
+                found |= self.output[node]
+        return found
+
+_SCORER = None
+
+def _init_scorer(matcher):
+    global _SCORER
+    _SCORER = matcher
+
+def _score_case(case, response):
+    """Score one generated response against its case's expected patterns (worker)"""
+    found = _SCORER.find(response)
+    return {
+        "id": case["id"],
+        "prompt": case["prompt"],
+        "response": response,
+        "hits": {
+            metric: pattern.lower() in found for metric, pattern in case["expected_patterns"].items()
+        },
+    }
+
+def _model_fingerprint(model_path):
+    """Cheap identity of a saved model: names, sizes and mtimes of its files"""
+    if not os.path.isdir(model_path):
+        return model_path
+    return [
+        (name, st.st_size, st.st_mtime_ns)
+        for name in sorted(os.listdir(model_path))
+        for st in [os.stat(os.path.join(model_path, name))]
+    ]
+
 class UMPFEquivalencyTrainer:
     """
     Trainer class for UMPF Equivalency Pattern Recognition Engine
     """
     
-    def __init__(self, model_name="microsoft/DialoGPT-medium", max_length=2048):
+    def __init__(self, model_name="microsoft/DialoGPT-medium", max_length=2048,
+                 lora_rank=None, lora_alpha=None, lora_dropout=0.05,
+                 lora_target_modules=("c_attn", "c_proj"), load_in_8bit=False):
         """
         Initialize the UMPF trainer
         
         Args:
             model_name: Base model to fine-tune
             max_length: Maximum sequence length
+            lora_rank: Train rank-``lora_rank`` LoRA adapters on a frozen base
+                instead of every weight (None for full fine-tuning)
+            lora_alpha: LoRA scaling numerator (defaults to 2 * lora_rank)
+            lora_dropout: Dropout on the LoRA path
+            lora_target_modules: Module names that get adapters
+            load_in_8bit: Quantize the frozen base to 8 bits (LoRA on CUDA only)
         """
         self.model_name = model_name
         self.max_length = max_length
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.lora = lora_rank is not None
+        self.lora_rank = lora_rank
+        self.lora_alpha = lora_alpha or (2 * lora_rank if self.lora else None)
+        self.lora_dropout = lora_dropout
+        self.lora_target_modules = list(lora_target_modules)
+        self.load_in_8bit = load_in_8bit
+        
+        # Tokenizer and model are loaded on first access, so steps that
+        # never touch them (data preparation, evaluation) stay fast
+        self._tokenizer = None
+        self._model = None
+        
+        # Inference engines by model path, shared by testing and evaluation
+        self._engines = {}
+    
+    @property
+    def device(self):
+        import torch
+        
+        return "cuda" if torch.cuda.is_available() else "cpu"
+    
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+            
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            if self._tokenizer.pad_token is None:
+                self._tokenizer.pad_token = self._tokenizer.eos_token
+        return self._tokenizer
+    
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self._load_model()
+        return self._model
+    
+    def _load_model(self):
+        """Load the base model, wrapped with LoRA adapters in LoRA mode"""
+        import torch
+        from transformers import AutoModelForCausalLM, BitsAndBytesConfig
         
         logger.info(f"Initializing UMPF Trainer on {self.device}")
-        logger.info(f"Base model: {model_name}")
+        logger.info(f"Base model: {self.model_name}")
         
-        # Load tokenizer and model
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        if self.tokenizer.pad_token is None:
-            self.tokenizer.pad_token = self.tokenizer.eos_token
+        load_in_8bit = self.load_in_8bit
+        if load_in_8bit and not (self.lora and torch.cuda.is_available()):
+            logger.warning("8-bit loading needs LoRA mode and CUDA; loading the base model unquantized")
+            load_in_8bit = False
+        
+        if torch.cuda.is_available():
+            dtype = torch.float16
+        elif self.lora:
+            # The frozen base is never updated, so bfloat16 halves CPU memory
+            # safely (the adapters are upcast to float32 below)
+            dtype = torch.bfloat16
+        else:
+            dtype = torch.float32
             
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_name,
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-            device_map="auto" if torch.cuda.is_available() else None
+        model = AutoModelForCausalLM.from_pretrained(
+            self.model_name,
+            torch_dtype=dtype,
+            # Packed batching hooks the eager attention blocks
+            attn_implementation="eager",
+            device_map="auto" if torch.cuda.is_available() else None,
+            quantization_config=BitsAndBytesConfig(load_in_8bit=True) if load_in_8bit else None
         )
         
-    def load_training_data(self, json_file_path):
+        if self.lora:
+            from peft import LoraConfig, get_peft_model, prepare_model_for_kbit_training
+            
+            if load_in_8bit:
+                model = prepare_model_for_kbit_training(model)
+            else:
+                # Lets gradient checkpointing work with a frozen embedding layer
+                model.enable_input_require_grads()
+            model = get_peft_model(model, LoraConfig(
+                r=self.lora_rank,
+                lora_alpha=self.lora_alpha,
+                lora_dropout=self.lora_dropout,
+                target_modules=self.lora_target_modules,
+                fan_in_fan_out=model.config.model_type == "gpt2",  # GPT-2 uses Conv1D
+                task_type="CAUSAL_LM",
+            ))
+            # get_peft_model creates the adapters in the base dtype; in
+            # bfloat16/float16 small updates round away and fp16 AMP refuses
+            # to unscale, so the trainable weights are kept in float32
+            for param in model.parameters():
+                if param.requires_grad and param.dtype != torch.float32:
+                    param.data = param.data.float()
+            model.print_trainable_parameters()
+        
+        return model
+        
+    def inference_engine(self, model_path):
+        """Return the InferenceEngine for ``model_path``, loading it on first use"""
+        if model_path not in self._engines:
+            self._engines[model_path] = InferenceEngine(model_path)
+        return self._engines[model_path]
+        
+    def load_training_data(self, json_file_path, cache_dir=None, held_out_fraction=0.0):
         """
-        Load and preprocess UMPF equivalency training data
+        Stream and preprocess UMPF equivalency training data
+        
+        Examples are parsed one at a time and written to an Arrow file that
+        the returned dataset memory-maps, so peak RAM stays flat as the
+        corpus grows.
         
         Args:
-            json_file_path: Path to equivalency-training-pairs.json
+            json_file_path: Path to equivalency-training-pairs.json (or a
+                .jsonl file with one {"messages": [...]} example per line)
+            cache_dir: Where to write the Arrow cache (datasets default if None)
+            held_out_fraction: Share of examples reserved for evaluation
+                (see held_out_test_cases) and left out of training
             
         Returns:
-            Dataset: Processed training dataset
+            Dataset: Processed, disk-backed training dataset
         """
+        from datasets import Dataset
+        
         logger.info(f"Loading training data from {json_file_path}")
         
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Size and mtime key the cache so an edited file is re-read
+        stat = os.stat(json_file_path)
+        dataset = Dataset.from_generator(
+            _formatted_examples,
+            gen_kwargs={
+                "path": os.path.abspath(json_file_path),
+                "fingerprint": f"{stat.st_size}-{stat.st_mtime_ns}",
+                "held_out_fraction": held_out_fraction,
+            },
+            cache_dir=cache_dir,
+        )
+        logger.info(f"Created dataset with {len(dataset)} examples")
         
-        # Extract training examples
-        training_examples = data["equivalency_training_dataset"]["training_examples"]
-        system_prompt = data["equivalency_training_dataset"]["system_prompt"]
+        return dataset
+    
+    def pretokenize(self, dataset, cache_root="./token-cache", num_proc=None, num_shards=None):
+        """
+        Tokenize ``dataset`` in parallel into memory-mappable token shards
         
-        logger.info(f"Found {len(training_examples)} training examples")
+        Shards are uint16 when the vocabulary fits, uint32 otherwise, and
+        live under ``cache_root/<token_cache_key>``. A complete cache (one
+        with a manifest) is reused as-is, so later runs and sweeps that keep
+        the data, tokenizer and ``max_length`` skip tokenization entirely.
         
-        # Format examples for training
-        formatted_examples = []
-        for example in training_examples:
-            messages = example["messages"]
-            
-            # Combine system, user, and assistant messages
-            conversation = ""
-            for msg in messages:
-                if msg["role"] == "system":
-                    conversation += f"<|system|>{msg['content']}<|endoftext|>"
-                elif msg["role"] == "user":
-                    conversation += f"<|user|>{msg['content']}<|endoftext|>"
-                elif msg["role"] == "assistant":
-                    conversation += f"<|assistant|>{msg['content']}<|endoftext|>"
+        Args:
+            dataset: Dataset with a "text" column (see load_training_data)
+            cache_root: Directory holding one subdirectory per cache key
+            num_proc: Worker processes (defaults to the CPU count)
+            num_shards: Output shards (defaults to num_proc)
             
-            formatted_examples.append({"text": conversation})
+        Returns:
+            TokenizedShards: Memory-mapped tokenized dataset
+        """
+        cache_dir = os.path.join(cache_root, token_cache_key(dataset, self.tokenizer, self.max_length))
+        if os.path.exists(os.path.join(cache_dir, "manifest.json")):
+            logger.info(f"Reusing token cache {cache_dir}")
+            return TokenizedShards(cache_dir)
         
-        # Create dataset
-        dataset = Dataset.from_list(formatted_examples)
-        logger.info(f"Created dataset with {len(dataset)} examples")
+        num_proc = num_proc or os.cpu_count() or 1
+        num_shards = max(1, min(num_shards or num_proc, len(dataset)))
+        dtype = np.uint16 if len(self.tokenizer) <= np.iinfo(np.uint16).max + 1 else np.uint32
+        os.makedirs(cache_dir, exist_ok=True)
+        logger.info(f"Tokenizing {len(dataset)} examples into {num_shards} shards with {num_proc} processes")
         
-        return dataset
+        names = [f"shard-{i:05d}" for i in range(num_shards)]
+        with ProcessPoolExecutor(max_workers=num_proc) as pool:
+            counts = list(pool.map(
+                _tokenize_shard,
+                [self.tokenizer] * num_shards,
+                [dataset.shard(num_shards, i, contiguous=True) for i in range(num_shards)],
+                [os.path.join(cache_dir, name) for name in names],
+                [self.max_length] * num_shards,
+                [dtype] * num_shards,
+            ))
+        
+        # The manifest is written last and marks the cache as complete
+        manifest = {
+            "shards": names,
+            "examples": counts,
+            "dtype": np.dtype(dtype).name,
+            "max_length": self.max_length,
+            "tokenizer": self.tokenizer.name_or_path,
+        }
+        tmp_path = os.path.join(cache_dir, "manifest.json.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, os.path.join(cache_dir, "manifest.json"))
+        
+        return TokenizedShards(cache_dir)
     
     def tokenize_function(self, examples):
         """Tokenize training examples"""
@@ -126,18 +993,85 @@ class UMPFEquivalencyTrainer:
             return_tensors="pt"
         )
     
+    def _build_trainer(self, dataset, training_args, batching="padded", checkpoint_budget_gb=None):
+        """
+        Create the trainer for ``dataset`` and ``batching`` mode
+        
+        Returns the trainer and, for pre-tokenized data, the
+        ThroughputCallback measuring it (None otherwise).
+        """
+        from transformers import DataCollatorForLanguageModeling
+        
+        classes = training_classes()
+        if not isinstance(dataset, TokenizedShards):
+            # Use SFTTrainer for instruction following
+            trainer = classes.CheckpointingSFTTrainer(
+                model=self.model,
+                train_dataset=dataset,
+                tokenizer=self.tokenizer,
+                args=training_args,
+                dataset_text_field="text",
+                max_seq_length=self.max_length,
+                checkpoint_budget_gb=checkpoint_budget_gb,
+            )
+            return trainer, None
+        
+        # Already tokenized: plain causal-LM training
+        if batching == "packed":
+            dataset = PackedShards(dataset, self.max_length)
+            collator = TokenCountingCollator(PackedCollator(self.tokenizer.pad_token_id))
+        elif batching in ("padded", "bucketed"):
+            collator = TokenCountingCollator(DataCollatorForLanguageModeling(self.tokenizer, mlm=False))
+        else:
+            raise ValueError(f"Unknown batching mode: {batching}")
+        
+        throughput = classes.ThroughputCallback(collator)
+        trainer_class = classes.LengthGroupedTrainer if batching == "bucketed" else classes.CheckpointingTrainer
+        trainer = trainer_class(
+            model=self.model,
+            train_dataset=dataset,
+            tokenizer=self.tokenizer,
+            args=training_args,
+            data_collator=collator,
+            callbacks=[throughput],
+            checkpoint_budget_gb=checkpoint_budget_gb,
+        )
+        return trainer, throughput
+    
+    def _train(self, trainer, batching, resume_from_checkpoint=None):
+        """Run ``trainer``, with packed attention hooks installed if needed"""
+        handles = enable_packed_attention(self.model) if batching == "packed" else []
+        try:
+            return trainer.train(resume_from_checkpoint=resume_from_checkpoint)
+        finally:
+            for handle in handles:
+                handle.remove()
+    
     def train_model(self, dataset, output_dir="./umpf-equivalency-model", 
-                   num_epochs=3, batch_size=4, learning_rate=5e-5):
+                   num_epochs=3, batch_size=4, learning_rate=5e-5, batching="padded",
+                   save_steps=200, checkpoint_budget_gb=10, resume=True):
         """
         Fine-tune model on UMPF equivalency data
         
         Args:
-            dataset: Training dataset
+            dataset: Training dataset, either text (trained with SFTTrainer)
+                or TokenizedShards from pretokenize (trained with Trainer)
             output_dir: Where to save the model
             num_epochs: Number of training epochs
             batch_size: Training batch size
             learning_rate: Learning rate
+            batching: For TokenizedShards, "padded" (dynamic padding),
+                "bucketed" (length-grouped batches) or "packed" (examples
+                concatenated to max_length with per-example attention)
+            save_steps: Steps between (asynchronous) checkpoints
+            checkpoint_budget_gb: Disk budget for checkpoints in output_dir;
+                the oldest are deleted beyond it (None keeps all)
+            resume: Continue from the latest complete checkpoint in
+                output_dir, if there is one
         """
+        import torch
+        from transformers import TrainingArguments
+        
         logger.info("Starting UMPF equivalency training...")
         
         # Training arguments optimized for Kaggle
@@ -149,9 +1083,9 @@ class UMPFEquivalencyTrainer:
             warmup_steps=100,
             learning_rate=learning_rate,
             logging_steps=10,
-            save_steps=500,
+            save_steps=save_steps,
             evaluation_strategy="no",  # No validation set for now
-            save_strategy="epoch",
+            save_strategy="steps",  # Kaggle sessions can end mid-epoch
             load_best_model_at_end=False,
             metric_for_best_model="loss",
             greater_is_better=False,
@@ -164,27 +1098,96 @@ class UMPFEquivalencyTrainer:
             remove_unused_columns=False,
         )
         
-        # Use SFTTrainer for instruction following
-        trainer = SFTTrainer(
-            model=self.model,
-            train_dataset=dataset,
-            tokenizer=self.tokenizer,
-            args=training_args,
-            dataset_text_field="text",
-            max_seq_length=self.max_length,
-        )
+        trainer, throughput = self._build_trainer(dataset, training_args, batching, checkpoint_budget_gb)
         
-        # Train the model
+        # Train the model, picking up where a previous session stopped
+        checkpoint = latest_checkpoint(output_dir) if resume else None
+        if checkpoint:
+            logger.info(f"Resuming from {checkpoint}")
         logger.info("Training started...")
-        trainer.train()
+        self._train(trainer, batching, checkpoint)
+        if throughput is not None:
+            stats = throughput.stats()
+            logger.info(f"Throughput ({batching}): {stats['tokens_per_sec']:.0f} tokens/sec, "
+                        f"{stats['padding_fraction']:.1%} padding")
         
-        # Save the final model
+        # Save the final model (only the adapter in LoRA mode)
         logger.info(f"Saving model to {output_dir}")
         trainer.save_model()
         self.tokenizer.save_pretrained(output_dir)
         
         return trainer
     
+    def export_model(self, adapter_dir, export_dir):
+        """
+        Merge a saved LoRA adapter into its base model and save the result
+        
+        The base is reloaded unquantized (an 8-bit base cannot be merged),
+        so the model being trained is left untouched.
+        
+        Args:
+            adapter_dir: Directory written by train_model in LoRA mode
+            export_dir: Where to save the standalone merged model
+            
+        Returns:
+            str: export_dir, loadable without peft
+        """
+        import torch
+        from peft import AutoPeftModelForCausalLM
+        
+        logger.info(f"Merging adapter {adapter_dir} into {self.model_name}")
+        merged = AutoPeftModelForCausalLM.from_pretrained(
+            adapter_dir,
+            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
+        ).merge_and_unload()
+        merged.save_pretrained(export_dir)
+        self.tokenizer.save_pretrained(export_dir)
+        logger.info(f"Merged model saved to {export_dir}")
+        return export_dir
+    
+    def compare_batching_throughput(self, dataset, modes=("padded", "bucketed", "packed"),
+                                    max_steps=20, batch_size=2):
+        """
+        Measure tokens/sec of each batching mode on the current hardware
+        
+        Runs ``max_steps`` steps per mode with a zero learning rate, so the
+        model weights are left unchanged.
+        
+        Args:
+            dataset: TokenizedShards from pretokenize
+            modes: Batching modes to compare (see train_model)
+            max_steps: Optimizer steps per mode
+            batch_size: Training batch size
+            
+        Returns:
+            dict: mode -> {"tokens_per_sec", "padding_fraction"}
+        """
+        import torch
+        from transformers import TrainingArguments
+        
+        results = {}
+        with tempfile.TemporaryDirectory() as output_dir:
+            for batching in modes:
+                training_args = TrainingArguments(
+                    output_dir=output_dir,
+                    max_steps=max_steps,
+                    per_device_train_batch_size=batch_size,
+                    learning_rate=0.0,
+                    logging_steps=max_steps,
+                    save_strategy="no",
+                    fp16=torch.cuda.is_available(),
+                    gradient_checkpointing=True,
+                    dataloader_num_workers=0,
+                    report_to=None,
+                    remove_unused_columns=False,  # PackedCollator needs segment_lengths
+                )
+                trainer, throughput = self._build_trainer(dataset, training_args, batching)
+                self._train(trainer, batching)
+                results[batching] = throughput.stats()
+                logger.info(f"{batching}: {results[batching]['tokens_per_sec']:.0f} tokens/sec, "
+                            f"{results[batching]['padding_fraction']:.1%} padding")
+        return results
+    
     def test_equivalency_generation(self, model_path, test_prompts=None):
         """
         Test the trained model's ability to generate equivalency pairs
@@ -203,89 +1206,108 @@ class UMPFEquivalencyTrainer:
         
         logger.info("Testing equivalency generation...")
         
-        # Load trained model for inference
-        generator = pipeline(
-            "text-generation",
-            model=model_path,
-            tokenizer=model_path,
-            device=0 if torch.cuda.is_available() else -1,
-            torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
-        )
-        
+        engine = self.inference_engine(model_path)
         system_msg = "You are a Universal Pattern Recognition Engine trained on the Leibniz I-Ching Indra's Net Conjecture."
+        full_prompts = [
+            f"<|system|>{system_msg}<|endoftext|><|user|>{prompt}<|endoftext|><|assistant|>"
+            for prompt in test_prompts
+        ]
+        
+        try:
+            responses = engine.generate(full_prompts, max_new_tokens=512, temperature=0.7)
+        except Exception as e:
+            logger.error(f"Error generating responses: {e}")
+            return
         
-        for i, prompt in enumerate(test_prompts):
+        for i, (prompt, assistant_response) in enumerate(zip(test_prompts, responses)):
             logger.info(f"\n=== Test {i+1}: {prompt} ===")
-            
-            full_prompt = f"<|system|>{system_msg}<|endoftext|><|user|>{prompt}<|endoftext|><|assistant|>"
-            
-            try:
-                response = generator(
-                    full_prompt,
-                    max_length=1024,
-                    num_return_sequences=1,
-                    temperature=0.7,
-                    do_sample=True,
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    eos_token_id=self.tokenizer.eos_token_id,
-                )
-                
-                generated_text = response[0]["generated_text"]
-                # Extract just the assistant's response
-                assistant_response = generated_text.split("<|assistant|>")[-1].strip()
-                
-                logger.info(f"Generated Response:\n{assistant_response}\n")
-                
-            except Exception as e:
-                logger.error(f"Error generating response: {e}")
-    
-    def evaluate_model_quality(self, model_path, test_cases):
+            logger.info(f"Generated Response:\n{assistant_response}\n")
+    
+    def evaluate_model_quality(self, model_path, test_cases, results_dir=None, num_workers=2,
+                               max_new_tokens=512, temperature=0.3):
         """
         Evaluate trained model quality using predefined test cases
         
+        Generation runs in batches while worker processes score finished
+        batches with one Aho-Corasick pass per response. With
+        ``results_dir`` each case's result is stored under a hash of the
+        case, the model files and the generation settings as soon as it is
+        scored, and reruns (including after an interrupted session) only
+        generate and score cases whose hash is new.
+        
         Args:
             model_path: Path to trained model
-            test_cases: List of test cases with expected patterns
+            test_cases: List of test cases with expected patterns (see
+                held_out_test_cases); "system", if present, is sent as the
+                system message
+            results_dir: Directory for per-case result files
+            num_workers: Scoring processes
+            max_new_tokens: Upper bound on generated tokens per case
+            temperature: Sampling temperature
+            
+        Returns:
+            dict: Share of cases (that define the metric) hitting each metric
         """
         logger.info("Evaluating model quality...")
         
-        # Quality metrics to track
-        metrics = {
-            "monadic_structure_detection": 0,
-            "domain_identification": 0,
-            "equivalence_justification": 0,
-            "mathematical_rigor": 0,
-            "confidence_scoring": 0
-        }
-        
-        generator = pipeline(
-            "text-generation",
-            model=model_path,
-            tokenizer=model_path,
-            device=0 if torch.cuda.is_available() else -1
-        )
+        settings = json.dumps([_model_fingerprint(model_path), max_new_tokens, temperature])
+        results = {}
+        pending = []
+        for index, case in enumerate(test_cases):
+            case = {"id": str(index), "system": "", **case}
+            key = hashlib.sha256(json.dumps([case, settings], sort_keys=True).encode()).hexdigest()
+            path = os.path.join(results_dir, f"{key}.json") if results_dir else None
+            if path and os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    results[index] = json.load(f)
+            else:
+                pending.append((index, case, path))
+        logger.info(f"{len(results)} cached results, {len(pending)} cases to generate")
         
-        for test_case in test_cases:
-            prompt = test_case["prompt"]
-            expected_patterns = test_case["expected_patterns"]
-            
-            response = generator(
-                f"<|user|>{prompt}<|endoftext|><|assistant|>",
-                max_length=800,
-                temperature=0.3,
-                do_sample=True
+        if pending:
+            if results_dir:
+                os.makedirs(results_dir, exist_ok=True)
+            engine = self.inference_engine(model_path)
+            matcher = PatternMatcher(
+                p for _, case, _ in pending for p in case["expected_patterns"].values()
             )
+            prompts = [
+                (f"<|system|>{case['system']}<|endoftext|>" if case["system"] else "")
+                + f"<|user|>{case['prompt']}<|endoftext|><|assistant|>"
+                for _, case, _ in pending
+            ]
             
-            generated_text = response[0]["generated_text"]
+            def record(future):
+                index, _, path = futures.pop(future)
+                results[index] = future.result()
+                if path:
+                    tmp_path = f"{path}.tmp"
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        json.dump(results[index], f, indent=2)
+                    os.replace(tmp_path, path)
             
-            # Check for expected patterns
-            for pattern_type, pattern in expected_patterns.items():
-                if pattern.lower() in generated_text.lower():
-                    metrics[pattern_type] += 1
+            with ProcessPoolExecutor(num_workers, initializer=_init_scorer, initargs=(matcher,)) as pool:
+                futures = {}
+                try:
+                    # Workers score each batch while the next one is generated
+                    for batch, responses in engine.generate_batches(prompts, max_new_tokens, temperature):
+                        for i, response in zip(batch, responses):
+                            futures[pool.submit(_score_case, pending[i][1], response)] = pending[i]
+                        # Persist what finished meanwhile, so an interrupted session keeps it
+                        for future in [f for f in futures if f.done()]:
+                            record(future)
+                finally:
+                    # Keep everything already generated, even if generation failed
+                    for future in as_completed(list(futures)):
+                        record(future)
         
-        # Calculate quality scores
-        total_tests = len(test_cases)
-        quality_scores = {k: v/total_tests for k, v in metrics.items()}
+        # Calculate quality scores over the cases that define each metric
+        metrics = {}
+        for result in results.values():
+            for metric, hit in result["hits"].items():
+                hits, total = metrics.get(metric, (0, 0))
+                metrics[metric] = (hits + hit, total + 1)
+        quality_scores = {k: hits / total for k, (hits, total) in metrics.items()}
         
         logger.info(f"Model Quality Evaluation:")
         for metric, score in quality_scores.items():
@@ -293,74 +1315,145 @@ class UMPFEquivalencyTrainer:
         
         return quality_scores
 
-def main():
+# Configuration - adjust for Kaggle resources
+CONFIG = {
+    "model_name": "microsoft/DialoGPT-medium",  # Smaller model for Kaggle
+    "training_file": "/kaggle/input/umpf-training/equivalency-training-pairs.json",  # Kaggle input path
+    "output_dir": "/kaggle/working/umpf-equivalency-model",
+    "max_length": 1536,  # Reduced for memory efficiency
+    "num_epochs": 3,
+    "batch_size": 2,  # Small batch size for Kaggle GPU
+    "learning_rate": 3e-5,
+    "token_cache": "/kaggle/working/token-cache",  # Reused across sessions
+    "batching": "packed",  # "padded", "bucketed" or "packed"
+    "held_out_fraction": 0.1,  # Reserved for evaluation, not trained on
+    "eval_results_dir": "/kaggle/working/eval-results",
+    "save_steps": 200,  # Checkpoint often; sessions are time-boxed
+    "checkpoint_budget_gb": 8,  # Leaves room in /kaggle/working
+    "lora_rank": None,  # e.g. 16 to train a small adapter instead of every weight
+    "load_in_8bit": False,  # 8-bit frozen base for LoRA on GPU
+    "export_dir": "/kaggle/working/umpf-equivalency-merged",
+}
+
+# Hand-written quality check, evaluated alongside the held-out split
+DEFAULT_TEST_CASES = [
+    {
+        "prompt": "Generate an equivalency pair for cache miss patterns and trust variance.",
+        "expected_patterns": {
+            "monadic_structure_detection": "maybe",
+            "domain_identification": "cache",
+            "equivalence_justification": "isomorphism",
+            "mathematical_rigor": "functor",
+            "confidence_scoring": "confidence"
+        }
+    }
+]
+
+def resolve_config(overrides=None):
+    """
+    CONFIG with ``overrides`` applied and the local data fallback resolved
+    
+    Only the default Kaggle input path falls back to the local file; a
+    training file given in ``overrides`` must exist.
+    """
+    overrides = overrides or {}
+    config = {**CONFIG, **overrides}
+    
+    if not os.path.exists(config["training_file"]):
+        if "training_file" in overrides:
+            raise FileNotFoundError(f"Training file not found: {config['training_file']}")
+        # Not on Kaggle
+        logger.warning("Kaggle input path not found, using local path")
+        config["training_file"] = "./equivalency-training-pairs.json"
+    return config
+
+def build_trainer(config):
+    """UMPFEquivalencyTrainer for ``config`` (nothing heavy is loaded yet)"""
+    return UMPFEquivalencyTrainer(
+        model_name=config["model_name"],
+        max_length=config["max_length"],
+        lora_rank=config["lora_rank"],
+        load_in_8bit=config["load_in_8bit"]
+    )
+
+def trained_model_dir(config):
+    """Directory of the model to run inference with (the merged export in LoRA mode)"""
+    return config["export_dir"] if config["lora_rank"] is not None else config["output_dir"]
+
+def prepare_data(config, trainer=None):
+    """Stream the training file into its disk-backed dataset"""
+    trainer = trainer or build_trainer(config)
+    return trainer.load_training_data(
+        config["training_file"],
+        held_out_fraction=config["held_out_fraction"]
+    )
+
+def tokenize_data(config, trainer=None):
+    """Prepare the dataset and pre-tokenize it into cached shards"""
+    trainer = trainer or build_trainer(config)
+    return trainer.pretokenize(prepare_data(config, trainer), config["token_cache"])
+
+def train(config, trainer=None):
+    """Tokenize (or reuse the cache), train, and export merged weights in LoRA mode"""
+    trainer = trainer or build_trainer(config)
+    dataset = tokenize_data(config, trainer)
+    
+    trainer.train_model(
+        dataset=dataset,
+        output_dir=config["output_dir"],
+        num_epochs=config["num_epochs"],
+        batch_size=config["batch_size"],
+        learning_rate=config["learning_rate"],
+        batching=config["batching"],
+        save_steps=config["save_steps"],
+        checkpoint_budget_gb=config["checkpoint_budget_gb"]
+    )
+    logger.info("Training completed successfully!")
+    
+    # Adapters are merged into a standalone model for inference
+    if trainer.lora:
+        trainer.export_model(config["output_dir"], config["export_dir"])
+    return trained_model_dir(config)
+
+def evaluate(config, trainer=None, model_dir=None):
+    """Score the trained model on DEFAULT_TEST_CASES plus the held-out split"""
+    trainer = trainer or build_trainer(config)
+    test_cases = DEFAULT_TEST_CASES + held_out_test_cases(config["training_file"], config["held_out_fraction"])
+    return trainer.evaluate_model_quality(
+        model_dir or trained_model_dir(config),
+        test_cases,
+        results_dir=config["eval_results_dir"]
+    )
+
+def main(config=None):
     """
     Main training pipeline for UMPF Equivalency Recognition Engine
     """
     logger.info("=== UMPF Equivalency Pattern Recognition Training ===")
     logger.info("From Months to Minutes: Scientific Automation via I-Ching Patterns")
     
-    # Configuration - adjust for Kaggle resources
-    CONFIG = {
-        "model_name": "microsoft/DialoGPT-medium",  # Smaller model for Kaggle
-        "training_file": "/kaggle/input/umpf-training/equivalency-training-pairs.json",  # Kaggle input path
-        "output_dir": "/kaggle/working/umpf-equivalency-model",
-        "max_length": 1536,  # Reduced for memory efficiency
-        "num_epochs": 3,
-        "batch_size": 2,  # Small batch size for Kaggle GPU
-        "learning_rate": 3e-5,
-    }
-    
-    # Check if we're on Kaggle
-    if not os.path.exists(CONFIG["training_file"]):
-        logger.warning("Kaggle input path not found, using local path")
-        CONFIG["training_file"] = "./equivalency-training-pairs.json"
+    config = config or resolve_config()
     
     try:
         # Initialize trainer
-        trainer = UMPFEquivalencyTrainer(
-            model_name=CONFIG["model_name"],
-            max_length=CONFIG["max_length"]
-        )
-        
-        # Load training data
-        dataset = trainer.load_training_data(CONFIG["training_file"])
-        
-        # Train the model
-        trained_model = trainer.train_model(
-            dataset=dataset,
-            output_dir=CONFIG["output_dir"],
-            num_epochs=CONFIG["num_epochs"],
-            batch_size=CONFIG["batch_size"],
-            learning_rate=CONFIG["learning_rate"]
-        )
+        trainer = build_trainer(config)
         
-        logger.info("Training completed successfully!")
+        # Load, tokenize and train
+        model_dir = train(config, trainer)
         
         # Test the trained model
         logger.info("Testing equivalency generation...")
-        trainer.test_equivalency_generation(CONFIG["output_dir"])
+        trainer.test_equivalency_generation(model_dir)
         
         # Quality evaluation
-        test_cases = [
-            {
-                "prompt": "Generate an equivalency pair for cache miss patterns and trust variance.",
-                "expected_patterns": {
-                    "monadic_structure_detection": "maybe",
-                    "domain_identification": "cache",
-                    "equivalence_justification": "isomorphism",
-                    "mathematical_rigor": "functor",
-                    "confidence_scoring": "confidence"
-                }
-            }
-        ]
+        quality_scores = evaluate(config, trainer, model_dir)
         
-        quality_scores = trainer.evaluate_model_quality(CONFIG["output_dir"], test_cases)
-        
-        logger.info(f"Training completed! Model saved to: {CONFIG['output_dir']}")
+        logger.info(f"Training completed! Model saved to: {model_dir}")
         logger.info("Ready for equivalency pattern recognition!")
         
         # Clean up GPU memory
+        import torch
+        
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
             gc.collect()
@@ -369,9 +1462,66 @@ def main():
         logger.error(f"Training failed: {e}")
         raise
 
+def parse_args(argv=None):
+    """
+    Command line: one subcommand per pipeline step (the full pipeline by default)
+    
+    Each step imports only what it needs: prepare-data loads no model
+    libraries beyond datasets, tokenize only the tokenizer, and generate /
+    evaluate only the trained model.
+    """
+    parser = argparse.ArgumentParser(description="UMPF Equivalency Pattern Recognition training")
+    parser.add_argument("--training-file", help="Training data (.json or .jsonl)")
+    parser.add_argument("--output-dir", help="Model and checkpoint directory")
+    parser.add_argument("--model-name", help="Base model to fine-tune")
+    parser.add_argument("--max-length", type=int, help="Maximum sequence length")
+    parser.add_argument("--lora-rank", type=int, help="Train LoRA adapters of this rank")
+    commands = parser.add_subparsers(dest="command")
+    
+    commands.add_parser("prepare-data", help="stream the training file into an Arrow dataset")
+    commands.add_parser("tokenize", help="pre-tokenize into cached token shards")
+    train_parser = commands.add_parser("train", help="tokenize (cached) and train")
+    train_parser.add_argument("--batching", choices=("padded", "bucketed", "packed"))
+    train_parser.add_argument("--num-epochs", type=int)
+    generate_parser = commands.add_parser("generate", help="generate from the trained model")
+    generate_parser.add_argument("prompts", nargs="*", help="Prompts (defaults to the built-in tests)")
+    generate_parser.add_argument("--model-dir", help="Model to load (defaults to the trained model)")
+    evaluate_parser = commands.add_parser("evaluate", help="score the trained model on held-out cases")
+    evaluate_parser.add_argument("--model-dir", help="Model to load (defaults to the trained model)")
+    return parser.parse_args(argv)
+
+def run_cli(argv=None):
+    args = parse_args(argv)
+    overrides = {
+        key: value for key, value in vars(args).items()
+        if key in CONFIG and value is not None
+    }
+    config = resolve_config(overrides)
+    
+    if args.command is None:
+        main(config)
+    elif args.command == "prepare-data":
+        dataset = prepare_data(config)
+        logger.info(f"Prepared {len(dataset)} training examples")
+    elif args.command == "tokenize":
+        shards = tokenize_data(config)
+        logger.info(f"Tokenized {len(shards)} examples into {shards.cache_dir}")
+    elif args.command == "train":
+        train(config)
+    elif args.command == "generate":
+        build_trainer(config).test_equivalency_generation(
+            args.model_dir or trained_model_dir(config),
+            args.prompts or None
+        )
+    elif args.command == "evaluate":
+        evaluate(config, model_dir=args.model_dir)
+
 if __name__ == "__main__":
     # Set environment variables for Kaggle
     os.environ["TOKENIZERS_PARALLELISM"] = "false"
-    os.environ["TRANSFORMERS_CACHE"] = "/kaggle/working/cache"
+    # Model libraries are imported lazily, so this now takes effect; keep
+    # the default Hugging Face cache everywhere except on Kaggle
+    if os.path.isdir("/kaggle/working"):
+        os.environ.setdefault("TRANSFORMERS_CACHE", "/kaggle/working/cache")
     
-    main()
\ No newline at end of file
+    run_cli()
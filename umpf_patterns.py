@@ -0,0 +1,194 @@
+"""Indexed query engine over the Universal Monad Patterns in ``the-rosetta-stone.json``.
+
+The JSON is loaded once into flat ``Pattern`` records with inverted indexes
+by category, layer, monad and system, plus a token index over the pattern
+text, so faceted lookups are set intersections (and, once asked, plain
+dictionary hits) instead of JSON walks:
+
+    index = load_patterns()
+    index.query(category="Human/Social", layer="Control", monad="STM")
+    index.query(monad="State", text="evolves")
+"""
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+import argparse
+import json
+import os
+import re
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "the-rosetta-stone.json")
+LAYERS = ("Atomic", "Domain", "Control", "Orchestration")
+FACETS = ("category", "layer", "monad", "system", "token")
+
+_TOKEN = re.compile(r"[^\W_]+")
+_SPACE = re.compile(r"\s+")
+
+class Pattern(NamedTuple):
+    category: str
+    layer: Optional[str]  # None for a category's example patterns
+    text: str
+    monads: Tuple[str, ...]
+    systems: Tuple[str, ...]
+    source: str
+
+def _key(name: str) -> str:
+    return _SPACE.sub("", name).casefold()
+
+def _monad_key(name: str) -> str:
+    """Like ``_key``, minus a "monad(s)" suffix: "Free", "FreeMonads" and "Free monads" are one monad."""
+    key = _key(name)
+    for suffix in ("monads", "monad"):
+        if key.endswith(suffix) and len(key) > len(suffix):
+            return key[:-len(suffix)]
+    return key
+
+def _short_name(name: str, short_names: List[str]) -> str:
+    """The table category ("Human/Social") a tree category ("Human & Social Systems") refers to."""
+    first = _key(tokenize(name)[0]) if tokenize(name) else ""
+    for short in short_names:
+        if first and _key(short).startswith(first):
+            return short
+    return name
+
+def tokenize(text: str) -> List[str]:
+    """Case-folded word tokens, as used by the token index."""
+    return _TOKEN.findall(text.casefold())
+
+_FACET_KEYS = {"monad": _monad_key}
+
+class PatternIndex:
+    """Inverted indexes over every pattern in a ``UniversalMonadPatterns`` document.
+
+    Patterns come from three places:
+
+    - ``Categories``: one per system example, tagged with that system and
+      with the layer monad at the same position (``Monads[i]`` for the
+      ``i``-th example); tree names such as "Human & Social Systems" map
+      onto the short table categories ("Human/Social").
+    - ``AppendixA.Patterns`` and ``CrossLayerPatternTable.Patterns``: one per
+      category/layer cell, tagged with all of that layer's monads.
+    - ``SystemCategories``: each category's ``ExamplePatterns``, with no layer.
+
+    Facet values match case- and whitespace-insensitively, and monads also
+    ignore a "monad(s)" suffix, so "Free", "Free monads" and "FreeMonads"
+    are the same monad. The ``cache_size`` most recent distinct queries
+    are memoized.
+    """
+
+    def __init__(self, data: Dict[str, Any], cache_size: int = 4096):
+        umpf = data["UniversalMonadPatterns"]
+        tree = umpf.get("Categories", [])
+        categories = umpf.get("SystemCategories", {}).get("Categories", [])
+
+        monads_by_layer: Dict[str, Dict[str, str]] = {}
+        layer_monads = [(layer["Layer"], layer.get("Monads", [])) for c in tree for layer in c["Layers"]]
+        layer_monads += [
+            (layer["Layer"], layer.get("Monads", []))
+            for layer in umpf.get("HierarchicalLayers", {}).get("Layers", [])
+        ]
+        layer_monads += [(e["Layer"], [e["Monad"]]) for e in umpf.get("HaskellEncodings", {}).get("Examples", [])]
+        for layer, monads in layer_monads:
+            for monad in monads:
+                monads_by_layer.setdefault(layer, {}).setdefault(_monad_key(monad), monad)
+        self.monads_by_layer = {layer: tuple(monads.values()) for layer, monads in monads_by_layer.items()}
+
+        short_names = [c["Category"] for c in categories]
+        short_names += [row["Category"] for row in umpf.get("CrossLayerPatternTable", {}).get("Patterns", [])]
+        self.category_names = {c["Name"]: _short_name(c["Name"], short_names) for c in tree}
+
+        self.patterns: List[Pattern] = []
+        for c in tree:
+            category = self.category_names[c["Name"]]
+            for layer in c["Layers"]:
+                monads = layer.get("Monads", [])
+                for system, examples in layer.get("Systems", {}).items():
+                    for i, example in enumerate(examples):
+                        monad = (monads[i],) if i < len(monads) else ()
+                        self.patterns.append(Pattern(category, layer["Layer"], example, monad, (system,), "Categories"))
+        for source in ("AppendixA", "CrossLayerPatternTable"):
+            for row in umpf.get(source, {}).get("Patterns", []):
+                for layer in LAYERS:
+                    if row.get(layer):
+                        monads = self.monads_by_layer.get(layer, ())
+                        self.patterns.append(Pattern(row["Category"], layer, row[layer], monads, (), source))
+        for c in categories:
+            for example in c.get("ExamplePatterns", []):
+                self.patterns.append(Pattern(c["Category"], None, example, (), (), "SystemCategories"))
+
+        postings: Dict[str, Dict[str, set]] = {facet: {} for facet in FACETS}
+        self._names: Dict[str, Dict[str, str]] = {facet: {} for facet in FACETS}
+        for i, p in enumerate(self.patterns):
+            values = {
+                "category": (p.category,),
+                "layer": (p.layer,) if p.layer else (),
+                "monad": p.monads,
+                "system": p.systems,
+                "token": tokenize(p.text)
+            }
+            for facet, names in values.items():
+                key = _FACET_KEYS.get(facet, _key)
+                for name in names:
+                    postings[facet].setdefault(key(name), set()).add(i)
+                    self._names[facet].setdefault(key(name), name)
+        for name, short in self.category_names.items():
+            if _key(short) in postings["category"]:
+                postings["category"].setdefault(_key(name), postings["category"][_key(short)])
+        self._index: Dict[str, Dict[str, FrozenSet[int]]] = {
+            facet: {key: frozenset(ids) for key, ids in keys.items()}
+            for facet, keys in postings.items()
+        }
+        self._all = frozenset(range(len(self.patterns)))
+        self._cached_query = lru_cache(maxsize=cache_size)(self._query)
+
+    def query(
+        self,
+        category: str = None,
+        layer: str = None,
+        monad: str = None,
+        system: str = None,
+        text: str = None
+    ) -> Tuple[Pattern, ...]:
+        """Patterns matching every given facet, in document order.
+
+        ``text`` matches patterns containing all of its tokens. Results are
+        kept in a bounded LRU cache, so repeated lookups are a single hit.
+        """
+        return self._cached_query(category, layer, monad, system, text)
+
+    def _query(self, category: str, layer: str, monad: str, system: str, text: str) -> Tuple[Pattern, ...]:
+        constraints = [
+            self._index[facet].get(_FACET_KEYS.get(facet, _key)(value), frozenset())
+            for facet, value in zip(FACETS, (category, layer, monad, system))
+            if value is not None
+        ]
+        constraints += [self._index["token"].get(token, frozenset()) for token in tokenize(text or "")]
+        ids = frozenset.intersection(*constraints) if constraints else self._all
+        return tuple(self.patterns[i] for i in sorted(ids))
+
+    def values(self, facet: str) -> List[str]:
+        """Distinct values of ``facet`` (one of ``FACETS``), as spelled in the document."""
+        return sorted(self._names[facet].values())
+
+    def layers_for_monad(self, monad: str) -> List[str]:
+        """Layers whose monads include ``monad``."""
+        return [layer for layer, monads in self.monads_by_layer.items() if _monad_key(monad) in map(_monad_key, monads)]
+
+@lru_cache(maxsize=None)
+def load_patterns(path: str = DEFAULT_PATH) -> PatternIndex:
+    """Parse and index ``path`` once; later calls return the same index."""
+    with open(path, encoding="utf-8") as f:
+        return PatternIndex(json.load(f))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the Universal Monad Patterns")
+    parser.add_argument("--path", default=DEFAULT_PATH, help="UMPF JSON document")
+    parser.add_argument("--category")
+    parser.add_argument("--layer")
+    parser.add_argument("--monad")
+    parser.add_argument("--system")
+    parser.add_argument("--text", help="words that must all appear")
+    args = parser.parse_args()
+
+    index = load_patterns(args.path)
+    for p in index.query(args.category, args.layer, args.monad, args.system, args.text):
+        print(f"{p.category:<14} {p.layer or '-':<14} {p.text}  [{', '.join(p.monads + p.systems)}]")